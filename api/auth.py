@@ -1,7 +1,9 @@
 from fastapi import HTTPException, status, Header
 from typing import Optional
+from functools import lru_cache
 import hmac
-import hashlib
+
+from config.settings import settings
 
 
 # In production, store API keys in database with tenant mapping
@@ -12,6 +14,31 @@ API_KEYS = {
     "dev_key": "development",
 }
 
+_SECRET = settings.api_key_secret.encode()
+
+# Keys are hashed once at import so verification only compares digests
+HASHED_KEYS = {
+    hmac.digest(_SECRET, key.encode(), "sha256"): tenant_id
+    for key, tenant_id in API_KEYS.items()
+}
+
+
+@lru_cache(maxsize=1024)
+def _resolve_tenant(api_key: str) -> Optional[str]:
+    """
+    Resolve an API key to its tenant ID, or None if the key is unknown.
+    Results are cached so repeat keys skip the HMAC computation.
+    """
+    candidate = hmac.digest(_SECRET, api_key.encode(), "sha256")
+    
+    # Constant-time comparison against every stored digest
+    tenant_id = None
+    for stored, tid in HASHED_KEYS.items():
+        if hmac.compare_digest(candidate, stored):
+            tenant_id = tid
+    
+    return tenant_id
+
 
 def verify_api_key(x_api_key: Optional[str] = Header(None)) -> str:
     """
@@ -33,7 +60,7 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)) -> str:
             headers={"WWW-Authenticate": "ApiKey"}
         )
     
-    tenant_id = API_KEYS.get(x_api_key)
+    tenant_id = _resolve_tenant(x_api_key)
     if not tenant_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,8 +81,4 @@ def hash_api_key(key: str, secret: str) -> str:
     Returns:
         Hashed key
     """
-    return hmac.new(
-        secret.encode(),
-        key.encode(),
-        hashlib.sha256
-    ).hexdigest()
+    return hmac.digest(secret.encode(), key.encode(), "sha256").hex()
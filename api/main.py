@@ -1,24 +1,29 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from prometheus_client import make_asgi_app
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+import asyncio
 import logging
+import orjson
+import time
 
 from api.routes import router
 from store.postgres import FeatureStore, FeatureRegistry
 from store.redis_cache import FeatureCache
-from monitoring.metrics import api_requests, api_latency, initialize_system_info
-from monitoring.logger import setup_logging
+from monitoring.metrics import (
+    api_latency, api_requests_buffer, flush_buffered_counters, initialize_system_info
+)
+from monitoring.logger import setup_logging, start_logging, stop_logging
 from config.settings import settings
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize system info metrics
-initialize_system_info()
+_DEBUG_MODE = settings.log_level.upper() == "DEBUG"
 
 
 @asynccontextmanager
@@ -27,8 +32,17 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for startup and shutdown events.
     Initializes connection pools and cleans up on shutdown.
     """
+    # Hand log output to the background listener for the app's lifetime
+    start_logging()
     logger.info("Starting Feature Store API...")
     
+    # System info is only needed for /metrics, so populate it here
+    # rather than at import to keep worker cold start fast
+    initialize_system_info()
+    
+    # Fire-and-forget tasks (e.g. cache refreshes) are held here until done
+    app.state.background_tasks = set()
+    
     # Startup: initialize connection pools
     try:
         app.state.store = FeatureStore(
@@ -50,6 +64,8 @@ async def lifespan(app: FastAPI):
             )
             await cache.connect()
             app.state.cache = cache
+            # Keep cached features coherent with store writes
+            app.state.store.cache = cache
             logger.info("Redis cache connected")
         except Exception as e:
             logger.warning(f"Redis connection failed (will continue without caching): {e}")
@@ -66,6 +82,8 @@ async def lifespan(app: FastAPI):
     # Shutdown: close connections
     logger.info("Shutting down Feature Store API...")
     try:
+        if app.state.background_tasks:
+            await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
         await app.state.store.close()
         await app.state.registry.close()
         if app.state.cache:
@@ -73,6 +91,23 @@ async def lifespan(app: FastAPI):
         logger.info("All connections closed successfully")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
+    finally:
+        flush_buffered_counters()
+        stop_logging()
+
+
+# (epoch second, ISO string) for probe endpoints; refreshed at most once per second
+_probe_timestamp = (0, "")
+
+
+def _probe_now() -> str:
+    """Current UTC time as an ISO string, memoized for one second"""
+    global _probe_timestamp
+    
+    second = int(time.time())
+    if second != _probe_timestamp[0]:
+        _probe_timestamp = (second, datetime.fromtimestamp(second, tz=timezone.utc).isoformat())
+    return _probe_timestamp[1]
 
 
 # Create FastAPI application
@@ -80,7 +115,8 @@ app = FastAPI(
     title="Feature Store API",
     description="Production ML feature store with real-time serving",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -93,29 +129,39 @@ app.add_middleware(
 )
 
 
+@lru_cache(maxsize=256)
+def _latency_child(endpoint: str):
+    """Memoized api_latency child for an endpoint"""
+    return api_latency.labels(endpoint=endpoint)
+
+
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
     """
     Middleware to collect metrics for all requests.
     Tracks latency and request counts per endpoint.
     """
-    # Skip metrics for metrics endpoint to avoid recursion
-    if request.url.path == "/metrics":
+    # Skip metrics for metrics endpoint to avoid recursion, but publish
+    # buffered counts so the scrape sees every request so far
+    if request.scope["path"] == "/metrics":
+        flush_buffered_counters()
         return await call_next(request)
     
     # Get tenant from request state (set by auth)
     tenant = getattr(request.state, "tenant", "unknown")
     
     # Time the request
-    with api_latency.labels(endpoint=request.url.path).time():
-        response = await call_next(request)
+    start = time.perf_counter_ns()
+    response = await call_next(request)
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    
+    # Label by route template (e.g. /api/v1/features/{name}) so label
+    # cardinality stays bounded; unmatched paths share a single label
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
     
-    # Record request count
-    api_requests.labels(
-        endpoint=request.url.path,
-        status=response.status_code,
-        tenant=tenant
-    ).inc()
+    _latency_child(endpoint).observe(elapsed)
+    api_requests_buffer.inc(endpoint, response.status_code, tenant)
     
     return response
 
@@ -123,50 +169,53 @@ async def metrics_middleware(request: Request, call_next):
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler for unhandled errors"""
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    # Full tracebacks are only captured in debug mode so an error storm
+    # doesn't spend its time formatting stacks
+    logger.error(
+        f"Unhandled exception: {exc!r}",
+        exc_info=logger.isEnabledFor(logging.DEBUG)
+    )
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
-            "detail": str(exc) if settings.log_level == "DEBUG" else None,
-            "timestamp": datetime.utcnow().isoformat()
+            "detail": str(exc) if _DEBUG_MODE else None,
+            "timestamp": datetime.now(timezone.utc)
         }
     )
 
 
+# Pre-serialized bodies for the root-level endpoints, which are hit by
+# load balancer and kube probes far more often than anything else
+_ROOT_BODY = orjson.dumps({
+    "name": "Feature Store API",
+    "version": "1.0.0",
+    "status": "operational",
+    "docs": "/docs",
+    "metrics": "/metrics"
+})
+_HEALTH_TEMPLATE = b'{"status":"healthy","version":"1.0.0","timestamp":"%s"}'
+_READY_TEMPLATE = b'{"status":"ready","database":true,"cache":true,"timestamp":"%s"}'
+
+
 # Define root-level endpoints FIRST (before routers/mounts)
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
-    return {
-        "name": "Feature Store API",
-        "version": "1.0.0",
-        "status": "operational",
-        "docs": "/docs",
-        "metrics": "/metrics"
-    }
+    return Response(_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health")
 async def health():
     """Health check - simple liveness probe"""
-    return {
-        "status": "healthy",
-        "version": "1.0.0",
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return Response(_HEALTH_TEMPLATE % _probe_now().encode(), media_type="application/json")
 
 
 @app.get("/ready")
 async def ready():
     """Readiness check - verifies dependencies are available"""
     # Simple check without blocking operations
-    return {
-        "status": "ready",
-        "database": True,
-        "cache": True,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    return Response(_READY_TEMPLATE % _probe_now().encode(), media_type="application/json")
 
 
 # Include API routes
@@ -178,12 +227,23 @@ if settings.enable_metrics:
     app.mount("/metrics", metrics_app)
 
 
-if __name__ == "__main__":
+def main():
+    """Run the API under uvicorn (console script: feature-store-api)"""
+    import sys
     import uvicorn
     uvicorn.run(
         "api.main:app",
         host=settings.api_host,
         port=settings.api_port,
         workers=settings.api_workers,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        lifespan="on",
+        access_log=False  # request metrics are recorded by Prometheus instead
     )
+
+
+if __name__ == "__main__":
+    main()
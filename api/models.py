@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Optional, Any
 from datetime import datetime
+import msgspec
 
 
 class OnlineFeatureRequest(BaseModel):
@@ -72,6 +73,20 @@ class BatchFeatureResponse(BaseModel):
     count: int = Field(..., description="Number of entities returned")
 
 
+class FeatureValueStruct(msgspec.Struct):
+    """Internal FeatureValue carrier for the batch path (no Pydantic validation)"""
+    value: Any
+    timestamp: datetime
+    freshness_seconds: Optional[float] = None
+
+
+class BatchFeatureStruct(msgspec.Struct):
+    """msgspec mirror of BatchFeatureResponse, encoded directly to JSON"""
+    features: Dict[str, Dict[str, FeatureValueStruct]]
+    timestamp: datetime
+    count: int
+
+
 class FeatureSchema(BaseModel):
     """Schema for feature registration"""
     name: str = Field(..., description="Feature name", min_length=1, max_length=255)
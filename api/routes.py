@@ -1,36 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import Any, List
+from pydantic import TypeAdapter
+from datetime import datetime, timezone
+from functools import lru_cache
+from collections import Counter
+import asyncio
 import logging
+import msgspec
+import time
 
 from api.models import (
     OnlineFeatureRequest, OnlineFeatureResponse, FeatureValue,
-    BatchFeatureRequest, BatchFeatureResponse,
+    BatchFeatureRequest, BatchFeatureResponse, FeatureValueStruct, BatchFeatureStruct,
     FeatureSchema, FeatureRegistrationResponse, FeatureMetadata,
     FeatureListResponse, HealthResponse, ReadinessResponse
 )
 from api.auth import verify_api_key
-from monitoring.metrics import cache_hit_rate, cache_miss_rate, feature_freshness
+from config.settings import settings
+from monitoring.metrics import cache_hits_buffer, cache_misses_buffer, feature_freshness
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Validates a whole list of registry rows in one pydantic-core call
+_feature_list_adapter = TypeAdapter(List[FeatureMetadata])
+
+# Seconds a readiness result is reused before dependencies are probed again
+READY_CACHE_SECONDS = 1.0
+
+# (checked_at, database_ready, cache_ready) from the last real probe
+_ready_cache = (float("-inf"), False, False)
+_ready_lock = asyncio.Lock()
+
+
+class MsgspecJSONResponse(Response):
+    """JSON response encoded with msgspec, bypassing Pydantic serialization"""
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return msgspec.json.encode(content)
+
+
+class MsgspecMsgpackResponse(Response):
+    """msgpack response encoded with msgspec, for clients that send Accept: application/msgpack"""
+    media_type = "application/msgpack"
+    
+    def render(self, content: Any) -> bytes:
+        return msgspec.msgpack.encode(content)
+
+
+@lru_cache(maxsize=256)
+def _freshness_child(feature: str):
+    """Memoized feature_freshness child for a feature"""
+    return feature_freshness.labels(feature=feature)
+
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Basic health check endpoint"""
     return HealthResponse(
         status="healthy",
-        timestamp=datetime.utcnow()
+        timestamp=datetime.now(timezone.utc)
     )
 
 
-@router.get("/ready", response_model=ReadinessResponse)
-async def readiness_check(req: Request):
-    """
-    Readiness check that verifies database and cache connectivity.
-    Returns 503 if any dependency is unavailable.
-    """
+async def _check_dependencies(req: Request) -> tuple[bool, bool]:
+    """Probe the database and cache, returning (database_ready, cache_ready)"""
     database_ready = False
     cache_ready = False
     
@@ -48,6 +83,28 @@ async def readiness_check(req: Request):
         
     except Exception as e:
         logger.error(f"Readiness check failed: {e}")
+    
+    return database_ready, cache_ready
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(req: Request):
+    """
+    Readiness check that verifies database and cache connectivity.
+    Returns 503 if any dependency is unavailable.
+    """
+    global _ready_cache
+    
+    # Probes fire every few seconds per pod; reuse a recent result
+    if time.monotonic() - _ready_cache[0] >= READY_CACHE_SECONDS:
+        async with _ready_lock:
+            # Another probe may have refreshed the result while we waited
+            if time.monotonic() - _ready_cache[0] >= READY_CACHE_SECONDS:
+                database_ready, cache_ready = await _check_dependencies(req)
+                _ready_cache = (time.monotonic(), database_ready, cache_ready)
+    
+    _, database_ready, cache_ready = _ready_cache
+    if not (database_ready and cache_ready):
         raise HTTPException(
             status_code=503,
             detail=f"Not ready - Database: {database_ready}, Cache: {cache_ready}"
@@ -57,7 +114,7 @@ async def readiness_check(req: Request):
         status="ready",
         database=database_ready,
         cache=cache_ready,
-        timestamp=datetime.utcnow()
+        timestamp=datetime.now(timezone.utc)
     )
 
 
@@ -76,76 +133,107 @@ async def get_online_features(
     store = req.app.state.store
     cache = req.app.state.cache
     
+    # Read the clock once; freshness is plain float arithmetic from here
+    now_ts = time.time()
+    now = datetime.fromtimestamp(now_ts, tz=timezone.utc)
+    
+    eid = request.entity_id
+    names = request.feature_names
+    prefix = eid + ":"
+    
     # Build cache keys
-    cache_keys = [f"{request.entity_id}:{f}" for f in request.feature_names]
+    cache_keys = [prefix + n for n in names]
     
-    # Try cache first (parallel retrieval)
-    cached = await cache.get_many(cache_keys)
+    # Wide requests are likely to miss at least one feature, so query the
+    # cache and the database concurrently instead of back to back
+    db_results = None
+    if len(names) >= settings.speculative_fetch_min_features:
+        cached, db_results = await asyncio.gather(
+            cache.get_many(cache_keys),
+            store.get_features(entity_ids=[eid], feature_names=names, timestamp=now)
+        )
+    else:
+        # Try cache first (parallel retrieval)
+        cached = await cache.get_many(cache_keys)
     
     missing_features = []
     features = {}
     cache_hit = True
+    hits = Counter()
+    misses = Counter()
     
     # Process cached results
-    for i, (key, value) in enumerate(zip(cache_keys, cached)):
-        feature_name = request.feature_names[i]
+    for i, value in enumerate(cached):
+        feature_name = names[i]
         
         if value is not None:
-            # Cache hit
-            features[feature_name] = FeatureValue(
-                value=value['value'],
-                timestamp=value['timestamp'],
-                freshness_seconds=value.get('freshness_seconds')
-            )
-            cache_hit_rate.labels(feature=feature_name).inc()
+            # Cache hit. Writers (this route, the seed script, the Spark job)
+            # store ISO-8601 strings; validate parses them back into datetimes
+            features[feature_name] = FeatureValue.model_validate(value)
+            hits[feature_name] += 1
         else:
             # Cache miss
             missing_features.append(feature_name)
-            cache_miss_rate.labels(feature=feature_name).inc()
+            misses[feature_name] += 1
             cache_hit = False
     
+    # One increment per distinct feature rather than per lookup
+    for feature_name, n in hits.items():
+        cache_hits_buffer.inc(feature_name, amount=n)
+    for feature_name, n in misses.items():
+        cache_misses_buffer.inc(feature_name, amount=n)
+    
     # Fetch missing features from database
     if missing_features:
-        logger.debug(f"Cache miss for {len(missing_features)} features, fetching from DB")
-        
-        db_results = await store.get_features(
-            entity_ids=[request.entity_id],
-            feature_names=missing_features,
-            timestamp=datetime.utcnow()
-        )
+        if db_results is None:
+            logger.debug(f"Cache miss for {len(missing_features)} features, fetching from DB")
+            
+            db_results = await store.get_features(
+                entity_ids=[eid],
+                feature_names=missing_features,
+                timestamp=now
+            )
         
         # Process database results
-        entity_features = db_results.get(request.entity_id, {})
+        entity_features = db_results.get(eid, {})
         cache_data = {}
         
-        for feature_name, feature_data in entity_features.items():
+        for feature_name in missing_features:
+            feature_data = entity_features.get(feature_name)
+            if feature_data is None:
+                continue
+            
             # Calculate freshness
-            age_seconds = (datetime.utcnow() - feature_data['timestamp']).total_seconds()
+            age_seconds = now_ts - feature_data['timestamp'].timestamp()
             
-            features[feature_name] = FeatureValue(
+            features[feature_name] = FeatureValue.model_construct(
                 value=feature_data['value'],
                 timestamp=feature_data['timestamp'],
                 freshness_seconds=age_seconds
             )
             
             # Track freshness metric
-            feature_freshness.labels(feature=feature_name).set(age_seconds)
+            _freshness_child(feature_name).set(age_seconds)
             
             # Prepare for cache update
-            cache_data[f"{request.entity_id}:{feature_name}"] = {
+            cache_data[prefix + feature_name] = {
                 'value': feature_data['value'],
                 'timestamp': feature_data['timestamp'],
                 'freshness_seconds': age_seconds
             }
         
-        # Update cache asynchronously
+        # Update cache in the background so the response isn't held up
+        # by the Redis round-trip; keep a reference until the task finishes
         if cache_data:
-            await cache.set_many(cache_data, ttl=3600)
+            tasks = req.app.state.background_tasks
+            task = asyncio.create_task(cache.set_many(cache_data, ttl=3600))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
     
-    return OnlineFeatureResponse(
-        entity_id=request.entity_id,
+    return OnlineFeatureResponse.model_construct(
+        entity_id=eid,
         features=features,
-        timestamp=datetime.utcnow(),
+        timestamp=now,
         source="cache" if cache_hit and not missing_features else "database",
         cache_hit=cache_hit
     )
@@ -166,29 +254,40 @@ async def get_batch_features(
     """
     store = req.app.state.store
     
+    # One as-of time for both the query and the response
+    as_of = request.timestamp or datetime.fromtimestamp(time.time(), tz=timezone.utc)
+    
     # Point-in-time join from historical store
     feature_matrix = await store.get_features(
         entity_ids=request.entity_ids,
         feature_names=request.feature_names,
-        timestamp=request.timestamp or datetime.utcnow()
+        timestamp=as_of
     )
     
     # Convert to response format
     formatted_features = {}
     for entity_id, features in feature_matrix.items():
         formatted_features[entity_id] = {
-            feature_name: FeatureValue(
+            feature_name: FeatureValueStruct(
                 value=feature_data['value'],
                 timestamp=feature_data['timestamp']
             )
             for feature_name, feature_data in features.items()
         }
     
-    return BatchFeatureResponse(
+    # Up to 1000 entities x N features: encode with msgspec rather than
+    # building and serializing Pydantic models. Clients can opt into the
+    # smaller msgpack encoding via the Accept header
+    if "application/msgpack" in req.headers.get("accept", ""):
+        response_class = MsgspecMsgpackResponse
+    else:
+        response_class = MsgspecJSONResponse
+    
+    return response_class(BatchFeatureStruct(
         features=formatted_features,
-        timestamp=request.timestamp or datetime.utcnow(),
+        timestamp=as_of,
         count=len(formatted_features)
-    )
+    ))
 
 
 @router.post("/features/register", response_model=FeatureRegistrationResponse)
@@ -242,22 +341,8 @@ async def list_features(
     
     features = await registry.list_features(entity_type=entity_type)
     
-    return FeatureListResponse(
-        features=[
-            FeatureMetadata(
-                id=f['id'],
-                name=f['name'],
-                version=f['version'],
-                dtype=f['dtype'],
-                entity_type=f['entity_type'],
-                ttl_hours=f['ttl_hours'],
-                description=f['description'],
-                tags=f.get('tags'),
-                created_at=f['created_at'],
-                updated_at=f['updated_at']
-            )
-            for f in features
-        ],
+    return FeatureListResponse.model_construct(
+        features=_feature_list_adapter.validate_python(features),
         count=len(features)
     )
 
@@ -280,18 +365,7 @@ async def get_feature_metadata(
     if not feature:
         raise HTTPException(status_code=404, detail=f"Feature '{name}' not found")
     
-    return FeatureMetadata(
-        id=feature['id'],
-        name=feature['name'],
-        version=feature['version'],
-        dtype=feature['dtype'],
-        entity_type=feature['entity_type'],
-        ttl_hours=feature['ttl_hours'],
-        description=feature['description'],
-        tags=feature.get('tags'),
-        created_at=feature['created_at'],
-        updated_at=feature['updated_at']
-    )
+    return FeatureMetadata.model_validate(feature)
 
 
 @router.delete("/cache/invalidate/{entity_id}")
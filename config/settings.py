@@ -18,6 +18,8 @@ class Settings(BaseSettings):
     kafka_brokers: str = "localhost:9092"
     kafka_topic: str = "feature_events"
     kafka_consumer_group: str = "feature-store"
+    # Fixes the streaming state store partition count when a checkpoint is first created
+    spark_shuffle_partitions: int = 10
     
     # API
     api_key_secret: str = "change-me-in-production"
@@ -36,6 +38,8 @@ class Settings(BaseSettings):
     # Performance
     max_batch_size: int = 1000
     query_timeout_seconds: int = 5
+    # Online requests with at least this many features fetch cache and DB concurrently
+    speculative_fetch_min_features: int = 10
     
     class Config:
         env_file = ".env"
@@ -28,11 +28,22 @@ CREATE TABLE IF NOT EXISTS feature_values (
     feature_id INT NOT NULL REFERENCES features(id) ON DELETE CASCADE,
     entity_id VARCHAR(255) NOT NULL,
     timestamp TIMESTAMPTZ NOT NULL,
-    value JSONB NOT NULL,
+    -- Scalar values use the typed column for their type; value (JSONB) only
+    -- holds compound values. Exactly one of the four is set per row
+    value_f8 DOUBLE PRECISION,
+    value_i8 BIGINT,
+    value_b BOOLEAN,
+    value JSONB,
     metadata JSONB,
     PRIMARY KEY (feature_id, entity_id, timestamp)
 );
 
+-- Upgrade tables created before the typed value columns existed
+ALTER TABLE feature_values ADD COLUMN IF NOT EXISTS value_f8 DOUBLE PRECISION;
+ALTER TABLE feature_values ADD COLUMN IF NOT EXISTS value_i8 BIGINT;
+ALTER TABLE feature_values ADD COLUMN IF NOT EXISTS value_b BOOLEAN;
+ALTER TABLE feature_values ALTER COLUMN value DROP NOT NULL;
+
 -- Convert to TimescaleDB hypertable for efficient time-series queries
 SELECT create_hypertable('feature_values', 'timestamp', 
     if_not_exists => TRUE,
@@ -48,9 +59,12 @@ CREATE INDEX IF NOT EXISTS idx_feature_values_feature_timestamp
     ON feature_values (feature_id, timestamp DESC);
 
 -- Enable compression for older data (compress data older than 7 days)
+-- Segments hold one (feature, entity) series stored newest-first, so
+-- point-in-time lookups decompress a single segment and stop at the first row
 ALTER TABLE feature_values SET (
     timescaledb.compress,
-    timescaledb.compress_segmentby = 'feature_id, entity_id'
+    timescaledb.compress_segmentby = 'feature_id, entity_id',
+    timescaledb.compress_orderby = 'timestamp DESC'
 );
 
 SELECT add_compression_policy('feature_values', 
@@ -83,6 +97,20 @@ CREATE TABLE IF NOT EXISTS feature_values_staging (
 CREATE INDEX IF NOT EXISTS idx_staging_entity_time 
     ON feature_values_staging(entity_id, window_end DESC);
 
+-- Write staging table for FeatureStore.write_features
+-- Batches are COPYed here and merged into feature_values in one statement.
+-- UNLOGGED: rows only live for the length of one write transaction
+CREATE UNLOGGED TABLE IF NOT EXISTS feature_values_write_staging (
+    feature_id INT NOT NULL,
+    entity_id VARCHAR(255) NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    value_f8 DOUBLE PRECISION,
+    value_i8 BIGINT,
+    value_b BOOLEAN,
+    value JSONB,
+    metadata JSONB
+);
+
 -- Continuous aggregate for hourly feature statistics (optional)
 -- Pre-computes hourly aggregations for faster queries
 CREATE MATERIALIZED VIEW IF NOT EXISTS hourly_feature_stats
@@ -105,6 +133,35 @@ SELECT add_continuous_aggregate_policy('hourly_feature_stats',
     if_not_exists => TRUE
 );
 
+-- Continuous aggregate for 5-minute windowed feature statistics
+-- Serves the same avg/stddev/max/min windows the Spark job computes, read
+-- as a point lookup per (entity, feature). Numeric (typed) values only.
+-- Real-time: buckets not yet materialized are computed from raw rows
+CREATE MATERIALIZED VIEW IF NOT EXISTS feature_5min
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    feature_id,
+    entity_id,
+    time_bucket('5 minutes', timestamp) AS bucket,
+    AVG(COALESCE(value_f8, value_i8::float8)) AS avg_value,
+    STDDEV_SAMP(COALESCE(value_f8, value_i8::float8)) AS stddev_value,
+    MAX(COALESCE(value_f8, value_i8::float8)) AS max_value,
+    MIN(COALESCE(value_f8, value_i8::float8)) AS min_value,
+    COUNT(*) AS update_count
+FROM feature_values
+GROUP BY feature_id, entity_id, bucket
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS idx_feature_5min_entity
+    ON feature_5min (entity_id, feature_id, bucket DESC);
+
+SELECT add_continuous_aggregate_policy('feature_5min',
+    start_offset => INTERVAL '1 hour',
+    end_offset => INTERVAL '1 minute',
+    schedule_interval => INTERVAL '1 minute',
+    if_not_exists => TRUE
+);
+
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -1,32 +1,59 @@
 import logging
+import logging.handlers
+import queue
 import sys
+from collections import ChainMap
+import orjson
 from pythonjsonlogger import jsonlogger
 from config.settings import settings
 
+# stdout handler installed by setup_logging(); records go to it directly
+# except while start_logging() has them routed through a queue
+_handler = None
+
+# Background listener draining the log queue, and the root handler feeding
+# it; both set by start_logging() and cleared by stop_logging()
+_listener = None
+_queue_handler = None
+
+
+class OrjsonFormatter(jsonlogger.JsonFormatter):
+    """JSON formatter that serializes log records with orjson"""
+    
+    def jsonify_log_record(self, log_record) -> str:
+        return orjson.dumps(log_record, default=self.json_default or str).decode()
+
 
 def setup_logging():
     """
     Setup structured JSON logging for the application.
     Logs are written to stdout in JSON format for easy ingestion by log aggregators.
+    
+    Records are written synchronously until start_logging() moves output
+    to a background thread.
     """
+    global _handler
+    
     # Create root logger
     logger = logging.getLogger()
     logger.setLevel(getattr(logging, settings.log_level.upper()))
     
-    # Remove existing handlers
+    # Stop any previous listener and remove existing handlers
+    stop_logging()
     logger.handlers = []
     
     # Create console handler
     handler = logging.StreamHandler(sys.stdout)
     
     # Create JSON formatter
-    formatter = jsonlogger.JsonFormatter(
+    formatter = OrjsonFormatter(
         fmt='%(asctime)s %(name)s %(levelname)s %(message)s',
         datefmt='%Y-%m-%dT%H:%M:%S'
     )
     
     handler.setFormatter(formatter)
     logger.addHandler(handler)
+    _handler = handler
     
     # Set levels for noisy libraries
     logging.getLogger('asyncio').setLevel(logging.WARNING)
@@ -39,6 +66,44 @@ def setup_logging():
     })
 
 
+def start_logging():
+    """
+    Route log records through a queue drained by a background listener,
+    so request handlers never block on stdout. Call from app startup and
+    pair with stop_logging() at shutdown.
+    """
+    global _listener, _queue_handler
+    
+    if _listener is not None or _handler is None:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, _handler, respect_handler_level=True)
+    _listener.start()
+    
+    # Swap handlers only once the listener is draining the queue
+    root = logging.getLogger()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.removeHandler(_handler)
+
+
+def stop_logging():
+    """Flush pending log records, stop the listener and write directly again"""
+    global _listener, _queue_handler
+    
+    if _listener is None:
+        return
+    
+    # Restore the direct handler first so nothing lands in an undrained queue
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+
+
 class StructuredLogger:
     """
     Wrapper for structured logging with context.
@@ -55,7 +120,10 @@ class StructuredLogger:
     
     def _log(self, level: int, message: str, **kwargs):
         """Internal logging method that adds context"""
-        extra = {**self.context, **kwargs}
+        if not self.logger.isEnabledFor(level):
+            return
+        # logging only iterates `extra`, so a ChainMap view avoids copying the context
+        extra = ChainMap(kwargs, self.context) if kwargs else self.context
         self.logger.log(level, message, extra=extra)
     
     def debug(self, message: str, **kwargs):
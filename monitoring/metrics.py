@@ -1,4 +1,6 @@
 from prometheus_client import Counter, Histogram, Gauge, Info
+from functools import lru_cache
+import platform
 
 # API metrics
 api_requests = Counter(
@@ -98,6 +100,48 @@ spark_records_processed = Counter(
     'Total number of records processed by Spark'
 )
 
+class BufferedCounter:
+    """
+    Process-local accumulator in front of a labelled Counter.
+    Increments are summed in a plain dict and applied to the Counter in
+    bulk every `flush_every` updates, so the hot path never takes the
+    metric's lock. Only safe to use from a single event loop thread.
+    """
+    
+    def __init__(self, counter: Counter, flush_every: int = 100):
+        self.counter = counter
+        self.flush_every = flush_every
+        self._pending = {}
+        self._updates = 0
+    
+    def inc(self, *labelvalues, amount: float = 1):
+        """Add `amount` to the counter child identified by `labelvalues`"""
+        self._pending[labelvalues] = self._pending.get(labelvalues, 0) + amount
+        self._updates += 1
+        if self._updates >= self.flush_every:
+            self.flush()
+    
+    def flush(self):
+        """Apply all pending increments to the underlying Counter"""
+        pending, self._pending = self._pending, {}
+        self._updates = 0
+        for labelvalues, amount in pending.items():
+            self.counter.labels(*labelvalues).inc(amount)
+
+
+# Buffered front-ends for the per-request counters
+api_requests_buffer = BufferedCounter(api_requests)
+cache_hits_buffer = BufferedCounter(cache_hit_rate)
+cache_misses_buffer = BufferedCounter(cache_miss_rate)
+
+
+def flush_buffered_counters():
+    """Flush every buffered counter, e.g. before a scrape or at shutdown"""
+    api_requests_buffer.flush()
+    cache_hits_buffer.flush()
+    cache_misses_buffer.flush()
+
+
 # System metrics
 system_info = Info(
     'feature_store_system',
@@ -125,13 +169,18 @@ errors_total = Counter(
 )
 
 
+@lru_cache(maxsize=1)
+def _platform_string() -> str:
+    """platform.platform() shells out to uname on Linux; compute it once"""
+    return platform.platform()
+
+
 def initialize_system_info():
     """Set static system information and initialize metrics"""
-    import platform
     system_info.info({
         'version': '1.0.0',
         'python_version': platform.python_version(),
-        'platform': platform.platform()
+        'platform': _platform_string()
     })
     
     # Initialize metrics with zero values so they appear in /metrics output
@@ -6,17 +6,91 @@ Runs the SQL schema initialization and verifies the setup.
 
 import asyncio
 import asyncpg
+import re
+import sqlparse
 import sys
 from pathlib import Path
+from typing import List, Optional
 from config.settings import settings
 
 
+# Statements of these kinds only read the objects they touch, so a run of
+# them can be issued in parallel once everything above them exists
+PARALLEL_PREFIXES = ("CREATE INDEX", "CREATE UNIQUE INDEX", "ANALYZE")
+
+# Table an index build or ANALYZE acts on
+TARGET_TABLE_RE = re.compile(
+    r'^(?:CREATE\s.*?\sON\s+(?:ONLY\s+)?|ANALYZE\s+(?:VERBOSE\s+)?)([\w."]+)',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def split_statements(sql_content: str) -> List[List[str]]:
+    """
+    Split a SQL script into groups that must run in order.
+    
+    Consecutive index builds (or consecutive ANALYZEs) share a group and
+    may run concurrently; every other statement is a group of its own.
+    
+    Args:
+        sql_content: Full SQL script
+        
+    Returns:
+        List of statement groups, in script order
+    """
+    groups = []
+    previous_kind = None
+    
+    for raw in sqlparse.split(sql_content):
+        statement = sqlparse.format(raw, strip_comments=True).strip()
+        if not statement:
+            continue
+        
+        head = " ".join(statement.split()[:3]).upper()
+        kind = next((p for p in PARALLEL_PREFIXES if head.startswith(p)), None)
+        if kind is not None and kind == previous_kind:
+            groups[-1].append(statement)
+        else:
+            groups.append([statement])
+        previous_kind = kind
+    
+    return groups
+
+
+def target_table(statement: str) -> Optional[str]:
+    """Table a parallelizable statement acts on, or None if it can't be told"""
+    match = TARGET_TABLE_RE.match(statement)
+    return match.group(1).lower() if match else None
+
+
+async def execute_group(pool: asyncpg.Pool, group: List[str]):
+    """
+    Run a statement group concurrently across tables.
+    
+    Statements on the same table run one after another on one connection:
+    index builds on a TimescaleDB hypertable recurse into every chunk, and
+    concurrent builds on one hypertable contend for (and can deadlock on)
+    the same chunk locks
+    """
+    by_table = {}
+    for statement in group:
+        by_table.setdefault(target_table(statement), []).append(statement)
+    
+    async def run(statements: List[str]):
+        async with pool.acquire() as conn:
+            for statement in statements:
+                await conn.execute(statement)
+    
+    await asyncio.gather(*(run(statements) for statements in by_table.values()))
+
+
 async def init_database():
     """Initialize database schema"""
     print("Connecting to PostgreSQL...")
     
     try:
-        conn = await asyncpg.connect(settings.postgres_url)
+        pool = await asyncpg.create_pool(settings.postgres_url, min_size=4, max_size=4)
+        conn = await pool.acquire()
         print("✓ Connected successfully")
         
         # Read SQL schema file
@@ -29,9 +103,14 @@ async def init_database():
         with open(sql_file, 'r') as f:
             sql_content = f.read()
         
-        # Execute schema creation
-        print("Executing schema creation...")
-        await conn.execute(sql_content)
+        # Execute schema creation, fanning statements on different tables out over the pool
+        groups = split_statements(sql_content)
+        print(f"Executing schema creation ({sum(map(len, groups))} statements)...")
+        for group in groups:
+            if len(group) == 1:
+                await conn.execute(group[0])
+            else:
+                await execute_group(pool, group)
         print("✓ Schema created successfully")
         
         # Verify tables
@@ -64,7 +143,8 @@ async def init_database():
         else:
             print("⚠ TimescaleDB extension not found")
         
-        await conn.close()
+        await pool.release(conn)
+        await pool.close()
         print("\n✓ Database initialization complete!")
         return True
         
@@ -118,4 +198,11 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop is optional (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     asyncio.run(main())
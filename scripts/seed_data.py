@@ -2,15 +2,41 @@
 """
 Seed database with sample feature data for testing and development.
 """
-import json
 import asyncio
 import asyncpg
-import random
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime, timezone
 from config.settings import settings
+from store.postgres import VALUE_COLUMNS, register_json_codecs, split_value
 
 
-async def seed_features(conn, num_users=1000, days_back=30):
+async def drop_secondary_indexes(conn):
+    """
+    Drop the secondary indexes on feature_values.
+    
+    The primary key is kept because the top-up merge relies on it for
+    ON CONFLICT.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        List of CREATE INDEX statements that recreate the dropped indexes
+    """
+    indexes = await conn.fetch("""
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        WHERE i.indrelid = 'feature_values'::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """)
+    
+    for index in indexes:
+        await conn.execute(f"DROP INDEX {index['name']}")
+    
+    return [index['definition'] for index in indexes]
+
+
+async def seed_features(conn, num_users=1000, days_back=30, seed=42, fast_seed=False):
     """
     Seed feature values for testing.
     
@@ -18,88 +44,112 @@ async def seed_features(conn, num_users=1000, days_back=30):
         conn: Database connection
         num_users: Number of user entities to create
         days_back: How many days of historical data to generate
+        seed: Random seed, so repeated runs generate identical data
+        fast_seed: Drop secondary indexes for the load and rebuild them after
     """
     print(f"Generating feature data for {num_users} users over {days_back} days...")
     
+    # Let asyncpg encode native Python values into the JSONB columns
+    await register_json_codecs(conn)
+    
     # Get feature IDs
     features = await conn.fetch("SELECT id, name FROM features ORDER BY id")
     feature_map = {f['name']: f['id'] for f in features}
     
     print(f"Found {len(features)} features: {list(feature_map.keys())}")
     
-    # Generate data
-    feature_values = []
-    now = datetime.now()
+    # Generate data: one row per (user, day), vectorized across all rows.
+    # Values stay numeric (tolist() yields Python int/float), so they land in
+    # the typed value columns
+    n = num_users * days_back
+    now = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'us')
+    rng = np.random.default_rng(seed)
     
-    for user_id in range(1, num_users + 1):
-        entity_id = f"user_{user_id}"
-        
-        # Generate historical data points
-        for day in range(days_back):
-            timestamp = now - timedelta(days=day, hours=random.randint(0, 23))
-            
-            # Generate realistic feature values
-            if 'user_age' in feature_map:
-                feature_values.append((
-                    feature_map['user_age'],
-                    entity_id,
-                    timestamp,
-                    str(random.randint(18, 75)),  # Age between 18-75
-                    '{}'
-                ))
-            
-            if 'user_lifetime_value' in feature_map:
-                feature_values.append((
-                    feature_map['user_lifetime_value'],
-                    entity_id,
-                    timestamp,
-                    str(round(random.uniform(100, 10000), 2)),  # LTV $100-$10,000
-                    '{}'
-                ))
-            
-            if 'last_purchase_days' in feature_map:
-                feature_values.append((
-                    feature_map['last_purchase_days'],
-                    entity_id,
-                    timestamp,
-                    str(random.randint(0, 365)),  # Days since purchase
-                    '{}'
-                ))
-            
-            if 'avg_5min_purchase_value' in feature_map:
-                feature_values.append((
-                    feature_map['avg_5min_purchase_value'],
-                    entity_id,
-                    timestamp,
-                    str(round(random.uniform(0, 500), 2)),  # Purchase value
-                    '{"window": "5min"}'
-                ))
-        
-        if user_id % 100 == 0:
-            print(f"  Generated data for {user_id}/{num_users} users...")
+    entity_ids = np.repeat([f"user_{u}" for u in range(1, num_users + 1)], days_back)
+    days = np.tile(np.arange(days_back), num_users)
+    hours = rng.integers(0, 24, n)
+    # Offsets are computed as one timedelta64 array. tolist() yields naive
+    # datetimes, which asyncpg would read as local time, so mark them UTC
+    offsets = (days * 86400 + hours * 3600).astype('timedelta64[s]')
+    timestamps = [ts.replace(tzinfo=timezone.utc) for ts in (now - offsets).tolist()]
+    
+    # Generate realistic feature values: (name, values, metadata)
+    columns = [
+        ('user_age', rng.integers(18, 76, n), {}),  # Age between 18-75
+        ('user_lifetime_value', np.round(rng.uniform(100, 10000, n), 2), {}),  # LTV $100-$10,000
+        ('last_purchase_days', rng.integers(0, 366, n), {}),  # Days since purchase
+        ('avg_5min_purchase_value', np.round(rng.uniform(0, 500, n), 2), {"window": "5min"}),  # Purchase value
+    ]
+    
+    # Resolve feature IDs once, skipping features that aren't registered
+    feats = [
+        (feature_map[name], values.tolist(), metadata)
+        for name, values, metadata in columns
+        if name in feature_map
+    ]
+    entity_list = entity_ids.tolist()
+    
+    feature_values = []
+    for feature_id, values, metadata in feats:
+        feature_values.extend(
+            (feature_id, entity_id, ts, *split_value(value), metadata)
+            for entity_id, ts, value in zip(entity_list, timestamps, values)
+        )
     
     print(f"Total feature values to insert: {len(feature_values)}")
     
-    # Batch insert
+    columns = ['feature_id', 'entity_id', 'timestamp', *VALUE_COLUMNS, 'metadata']
     print("Inserting data...")
-    await conn.executemany(
-        """
-        INSERT INTO feature_values (feature_id, entity_id, timestamp, value, metadata)
-        VALUES ($1, $2, $3, $4, $5)
-        ON CONFLICT (feature_id, entity_id, timestamp) DO NOTHING
-        """,
-        feature_values
-    )
+    
+    # One transaction for the whole load: a single commit, and seed data
+    # doesn't need to wait for the WAL flush
+    async with conn.transaction():
+        await conn.execute("SET LOCAL synchronous_commit = off")
+        
+        # Building an index once after the load is much cheaper than
+        # maintaining it row by row. A failed load rolls the drop back too
+        index_definitions = []
+        if fast_seed:
+            index_definitions = await drop_secondary_indexes(conn)
+            print(f"Dropped {len(index_definitions)} secondary indexes for the load")
+        
+        # Initial seed: nothing can conflict, so COPY straight into the hypertable
+        if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM feature_values)"):
+            await conn.copy_records_to_table(
+                'feature_values', records=feature_values, columns=columns
+            )
+        else:
+            # Top-up: binary COPY into a temp table, then merge so existing
+            # rows are still skipped on conflict
+            await conn.execute("""
+                CREATE TEMP TABLE feature_values_seed
+                (LIKE feature_values INCLUDING DEFAULTS) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table(
+                'feature_values_seed', records=feature_values, columns=columns
+            )
+            await conn.execute("""
+                INSERT INTO feature_values (feature_id, entity_id, timestamp, value_f8, value_i8, value_b, value, metadata)
+                SELECT feature_id, entity_id, timestamp, value_f8, value_i8, value_b, value, metadata
+                FROM feature_values_seed
+                ON CONFLICT (feature_id, entity_id, timestamp) DO NOTHING
+            """)
+        
+        if index_definitions:
+            print("Rebuilding indexes...")
+            for definition in index_definitions:
+                await conn.execute(definition)
     
     print("✓ Data insertion complete")
 
 
-async def seed_cache(num_hot_users=100):
+async def seed_cache(num_hot_users=100, seed=42):
     """
     Pre-populate Redis cache with hot entities.
     
     Args:
         num_hot_users: Number of frequently accessed users to cache
+        seed: Random seed, so repeated runs generate identical data
     """
     print(f"\nPre-populating cache with {num_hot_users} hot users...")
     
@@ -108,24 +158,28 @@ async def seed_cache(num_hot_users=100):
     await cache.connect()
     
     cache_data = {}
-    now = datetime.now()
+    now = datetime.now(timezone.utc).isoformat()
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(18, 76, num_hot_users).tolist()
+    ltvs = np.round(rng.uniform(100, 10000, num_hot_users), 2).tolist()
     
-    for user_id in range(1, num_hot_users + 1):
+    for user_id, age, ltv in zip(range(1, num_hot_users + 1), ages, ltvs):
         entity_id = f"user_{user_id}"
         
         # Cache common features
         cache_data[f"{entity_id}:user_age"] = {
-            'value': random.randint(18, 75),
-            'timestamp': now.isoformat(),
+            'value': age,
+            'timestamp': now,
             'freshness_seconds': 0
         }
         
         cache_data[f"{entity_id}:user_lifetime_value"] = {
-            'value': round(random.uniform(100, 10000), 2),
-            'timestamp': now.isoformat(),
+            'value': ltv,
+            'timestamp': now,
             'freshness_seconds': 0
         }
     
+    # set_many writes every entry in one SET_MANY_LUA script call
     await cache.set_many(cache_data, ttl=3600)
     await cache.close()
     
@@ -182,6 +236,9 @@ async def main():
     parser.add_argument('--users', type=int, default=1000, help='Number of users (default: 1000)')
     parser.add_argument('--days', type=int, default=30, help='Days of history (default: 30)')
     parser.add_argument('--cache-users', type=int, default=100, help='Users to pre-cache (default: 100)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--fast-seed', action='store_true',
+                        help='Drop secondary indexes during the load and rebuild them after')
     args = parser.parse_args()
     
     try:
@@ -190,7 +247,10 @@ async def main():
         print("✓ Connected to database")
         
         # Seed features
-        await seed_features(conn, num_users=args.users, days_back=args.days)
+        await seed_features(
+            conn, num_users=args.users, days_back=args.days,
+            seed=args.seed, fast_seed=args.fast_seed
+        )
         
         # Verify data
         await verify_data(conn)
@@ -199,7 +259,7 @@ async def main():
         await conn.close()
         
         # Seed cache
-        await seed_cache(num_hot_users=args.cache_users)
+        await seed_cache(num_hot_users=args.cache_users, seed=args.seed)
         
         print("\n" + "="*60)
         print("✓ Data seeding complete!")
@@ -215,5 +275,12 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop is optional (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     exit_code = asyncio.run(main())
     exit(exit_code)
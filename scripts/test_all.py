@@ -5,25 +5,140 @@ Tests all major features and generates a report
 """
 
 import asyncio
+import contextlib
+import gzip
+import itertools
 import time
-import json
+import msgpack
+import orjson
+import statistics
+import sys
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
 import httpx
 
 
+# Every registered user feature, fetched in one request by the wide-serving test
+WIDE_FEATURES = ["user_age", "user_lifetime_value", "last_purchase_days", "avg_5min_purchase_value"]
+
+# A batched server path should keep a wide request within this factor of a 1-feature one
+WIDE_LATENCY_RATIO = 1.5
+
+PASS_PREFIX = "\033[92m[PASS]\033[0m "
+FAIL_PREFIX = "\033[91m[FAIL]\033[0m "
+
+
+def missing_c_extensions() -> List[str]:
+    """
+    Names of C accelerators that failed to load.
+    
+    Each of these silently falls back to a much slower pure-Python path
+    when pip builds it from an sdist instead of installing a wheel.
+    """
+    missing = []
+    
+    # msgpack's pure-Python fallback lives in msgpack.fallback
+    if msgpack.Packer.__module__ != "msgpack._cmsgpack":
+        missing.append("msgpack")
+    
+    # redis-py and uvicorn use these parsers only when they import
+    for module in ("hiredis", "httptools"):
+        try:
+            __import__(module)
+        except ImportError:
+            missing.append(module)
+    
+    return missing
+
+
 class FeatureStoreTestSuite:
     def __init__(self, base_url: str = "http://localhost:8000", api_key: str = "tenant1_key", 
-                 windows_mode: bool = False):
+                 windows_mode: bool = False, use_msgpack: bool = False,
+                 gzip_results: bool = False, in_process: bool = False):
         self.base_url = base_url
         self.api_key = api_key
         self.windows_mode = windows_mode  # More lenient targets for Windows
+        self.gzip_results = gzip_results  # Also write test_results.json.gz
         self.headers = {
             "X-API-Key": api_key,
             "Content-Type": "application/json"
         }
+        if use_msgpack:
+            # Endpoints that support it (batch) answer in msgpack; others stay JSON
+            self.headers["Accept"] = "application/msgpack"
         self.results = []
         
+        # Result lines are printed from self.results once the tests finish so
+        # console writes don't land between timed requests
+        self._flushed = 0
+        
+        # In-process mode dispatches straight into the ASGI app, skipping the
+        # loopback TCP stack, so timings isolate FastAPI/Redis/Postgres cost
+        self._app = None
+        if in_process:
+            from api.main import app
+            self._app = app
+            transport = httpx.ASGITransport(app=app)
+            base_url = "http://testserver"
+        else:
+            # One pooled client for the whole run so measurements reuse keep-alive
+            # connections instead of paying a TCP handshake per test. HTTP/2 is
+            # negotiated via ALPN over TLS (e.g. behind a cloud proxy); plain
+            # http:// against uvicorn stays on HTTP/1.1. The pool is sized so the
+            # 100-request concurrent test never queues for a connection, and no
+            # retries so a failed request shows up in the timings
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=0,
+                limits=httpx.Limits(
+                    max_connections=128,
+                    max_keepalive_connections=128,
+                    keepalive_expiry=30.0
+                )
+            )
+        
+        # Redirects are never followed (a redirect is a test failure, not an
+        # extra timed hop) and proxy/netrc/SSL environment lookups are skipped
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=self.headers,
+            timeout=10.0,
+            transport=transport,
+            follow_redirects=False,
+            trust_env=False
+        )
+        
+        # Entity IDs for the 100-entity tests, built once and shared
+        self._user_ids_100 = tuple(f"user_{i}" for i in range(1, 101))
+        
+        # Constant request bodies, encoded once so timed calls only measure the request
+        self._payloads = {
+            "register": orjson.dumps({
+                "name": "test_automated_feature",
+                "version": 1,
+                "dtype": "float64",
+                "entity_type": "user",
+                "ttl_hours": 24,
+                "description": "Automated test feature"
+            }),
+            "cache_hit": orjson.dumps({
+                "entity_id": "user_1",
+                "feature_names": ["user_age"]
+            }),
+            "wide": orjson.dumps({
+                "entity_id": "user_1",
+                "feature_names": WIDE_FEATURES
+            }),
+            "batch_small": orjson.dumps({
+                "entity_ids": ["user_1", "user_2", "user_3", "user_4", "user_5"],
+                "feature_names": ["user_age", "user_lifetime_value"]
+            }),
+            "batch_large": orjson.dumps({
+                "entity_ids": list(self._user_ids_100),
+                "feature_names": ["user_age"]
+            }),
+        }
+        
         # Set latency targets based on environment
         if windows_mode:
             self.cache_miss_target = 1000  # ms - Windows + Docker Desktop is slow
@@ -35,393 +150,458 @@ class FeatureStoreTestSuite:
             self.cache_miss_target = 20   # ms
             self.cache_hit_target = 10    # ms
         
+        # Requests per latency test; latency targets are checked against p95
+        self.bench_iterations = 20 if windows_mode else 200
+        self.bench_warmup = 2 if windows_mode else 20
+        
+    async def _post_json(self, path: str, payload: Union[Dict, bytes], **kwargs) -> httpx.Response:
+        """POST a JSON body (pre-encoded bytes or a dict encoded with orjson)"""
+        if not isinstance(payload, bytes):
+            payload = orjson.dumps(payload)
+        return await self.client.post(path, content=payload, **kwargs)
+    
+    @staticmethod
+    def _decode(response: httpx.Response):
+        """Decode a response body: msgpack if the server sent it, else JSON via orjson"""
+        if response.headers.get("content-type", "").startswith("application/msgpack"):
+            return msgpack.unpackb(response.content, raw=False, timestamp=3)
+        return orjson.loads(response.content)
+    
+    async def _bench(self, request_factory: Callable[[], Awaitable[httpx.Response]]
+                     ) -> Tuple[List[int], int, httpx.Response]:
+        """
+        Time a request repeatedly instead of trusting a single sample.
+        
+        Args:
+            request_factory: Callable returning a new request coroutine per call
+            
+        Returns:
+            (latencies in ns of successful timed requests, failed request count, last response)
+        """
+        for _ in range(self.bench_warmup):
+            await request_factory()
+        
+        samples = []
+        failures = 0
+        response = None
+        for _ in range(self.bench_iterations):
+            start = time.perf_counter_ns()
+            response = await request_factory()
+            elapsed = time.perf_counter_ns() - start
+            if response.status_code == 200:
+                samples.append(elapsed)
+            else:
+                failures += 1
+        
+        return samples, failures, response
+    
+    @staticmethod
+    def _percentiles_ms(samples: List[int]) -> Tuple[float, float, float]:
+        """p50, p95 and p99 of nanosecond samples, in ms (inf if there are too few)"""
+        if len(samples) < 2:
+            return float("inf"), float("inf"), float("inf")
+        q = statistics.quantiles(samples, n=100)
+        return q[49] / 1e6, q[94] / 1e6, q[98] / 1e6
+    
     def log_test(self, name: str, passed: bool, duration_ms: float, message: str = ""):
-        """Log test result"""
-        status = "PASS" if passed else "FAIL"
+        """Log test result (formatting is deferred to flush_log / the results file)"""
         self.results.append({
             "name": name,
-            "status": status,
-            "duration_ms": round(duration_ms, 2),
+            "status": "PASS" if passed else "FAIL",
+            "duration_ms": duration_ms,
             "message": message,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time_ns()
         })
-        
-        color = "\033[92m" if passed else "\033[91m"
-        reset = "\033[0m"
-        print(f"{color}[{status}]{reset} {name} ({duration_ms:.2f}ms) {message}")
+    
+    def flush_log(self):
+        """Write result lines logged since the last flush to stdout"""
+        lines = [
+            f"{PASS_PREFIX if r['status'] == 'PASS' else FAIL_PREFIX}{r['name']} ({r['duration_ms']:.2f}ms) {r['message']}\n"
+            for r in self.results[self._flushed:]
+        ]
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
+        self._flushed = len(self.results)
     
     async def test_health_check(self):
         """Test 1: Health endpoint"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{self.base_url}/health")
-                duration_ms = (time.time() - start) * 1000
-                
-                data = response.json()
-                passed = response.status_code == 200 and data.get("status") == "healthy"
-                msg = f"status={data.get('status')}" if not passed else ""
-                self.log_test("Health Check", passed, duration_ms, msg)
-                return passed
+            response = await self.client.get("/health")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            data = self._decode(response)
+            passed = response.status_code == 200 and data.get("status") == "healthy"
+            msg = f"status={data.get('status')}" if not passed else response.http_version
+            self.log_test("Health Check", passed, duration_ms, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Health Check", False, duration_ms, f"Error: {type(e).__name__}: {str(e)}")
             return False
     
     async def test_readiness_check(self):
         """Test 2: Readiness endpoint"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{self.base_url}/ready")
-                duration_ms = (time.time() - start) * 1000
-                
-                data = response.json()
-                passed = (response.status_code == 200 and 
-                         data.get("status") == "ready" and
-                         data.get("database") and
-                         data.get("cache"))
-                msg = f"db={data.get('database')}, cache={data.get('cache')}" if not passed else ""
-                self.log_test("Readiness Check", passed, duration_ms, msg)
-                return passed
+            response = await self.client.get("/ready")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            data = self._decode(response)
+            passed = (response.status_code == 200 and 
+                     data.get("status") == "ready" and
+                     data.get("database") and
+                     data.get("cache"))
+            msg = f"db={data.get('database')}, cache={data.get('cache')}" if not passed else ""
+            self.log_test("Readiness Check", passed, duration_ms, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Readiness Check", False, duration_ms, f"Error: {type(e).__name__}: {str(e)}")
             return False
     
     async def test_feature_registration(self):
         """Test 3: Feature registration"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/features/register",
-                    headers=self.headers,
-                    json={
-                        "name": "test_automated_feature",
-                        "version": 1,
-                        "dtype": "float64",
-                        "entity_type": "user",
-                        "ttl_hours": 24,
-                        "description": "Automated test feature"
-                    }
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200 and "feature_id" in response.json()
-                self.log_test("Feature Registration", passed, duration_ms)
-                return passed
+            response = await self._post_json("/api/v1/features/register", self._payloads["register"])
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            passed = response.status_code == 200 and "feature_id" in self._decode(response)
+            self.log_test("Feature Registration", passed, duration_ms)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Feature Registration", False, duration_ms, str(e))
             return False
     
     async def test_list_features(self):
         """Test 4: List all features"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/features",
-                    headers=self.headers
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                data = response.json()
-                passed = response.status_code == 200 and "features" in data and len(data["features"]) > 0
-                self.log_test("List Features", passed, duration_ms, f"Found {len(data.get('features', []))} features")
-                return passed
+            response = await self.client.get("/api/v1/features")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            data = self._decode(response)
+            passed = response.status_code == 200 and "features" in data and len(data["features"]) > 0
+            self.log_test("List Features", passed, duration_ms, f"Found {len(data.get('features', []))} features")
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("List Features", False, duration_ms, str(e))
             return False
     
     async def test_online_serving_cache_miss(self):
         """Test 5: Online serving (cache miss)"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            # Use a unique entity ID to ensure cache miss
-            entity_id = f"user_test_{int(time.time())}"
+            # Use a unique entity ID per request to ensure cache misses
+            run_id = int(time.time())
+            counter = itertools.count()
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/features/online",
-                    headers=self.headers,
-                    json={
-                        "entity_id": entity_id,
+            def request():
+                return self._post_json(
+                    "/api/v1/features/online",
+                    {
+                        "entity_id": f"user_test_{run_id}_{next(counter)}",
                         "feature_names": ["user_age"]
                     }
                 )
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200 and "features" in response.json()
-                latency_ok = duration_ms < self.cache_miss_target
-                
-                msg = f"Latency: {duration_ms:.2f}ms {'(OK)' if latency_ok else f'(target: <{self.cache_miss_target}ms)'}"
-                self.log_test("Online Serving (Cache Miss)", passed and latency_ok, duration_ms, msg)
-                return passed
+            
+            samples, failures, response = await self._bench(request)
+            passed = failures == 0 and "features" in self._decode(response)
+            p50, p95, p99 = self._percentiles_ms(samples)
+            latency_ok = p95 < self.cache_miss_target
+            
+            msg = (f"p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms over {len(samples)} requests "
+                   f"{'(OK)' if latency_ok else f'(target p95: <{self.cache_miss_target}ms)'}")
+            self.log_test("Online Serving (Cache Miss)", passed and latency_ok, p95, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Online Serving (Cache Miss)", False, duration_ms, str(e))
             return False
     
     async def test_online_serving_cache_hit(self):
         """Test 6: Online serving (cache hit)"""
-        # First request to populate cache
-        entity_id = "user_1"
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            await client.post(
-                f"{self.base_url}/api/v1/features/online",
-                headers=self.headers,
-                json={
-                    "entity_id": entity_id,
-                    "feature_names": ["user_age"]
-                }
-            )
+        payload = self._payloads["cache_hit"]
         
-        # Second request should hit cache
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/features/online",
-                    headers=self.headers,
-                    json={
-                        "entity_id": entity_id,
-                        "feature_names": ["user_age"]
-                    }
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                data = response.json()
-                # Pass if we get a successful response with features
-                # Source field is optional - it may not be set correctly in all environments
-                passed = (response.status_code == 200 and "features" in data)
-                
-                latency_ok = duration_ms < self.cache_hit_target
-                source_info = data.get("source", "not_set")
-                
-                msg = f"Latency: {duration_ms:.2f}ms (target: <{self.cache_hit_target}ms), Source: {source_info}"
-                self.log_test("Online Serving (Cache Hit)", passed and latency_ok, duration_ms, msg)
-                return passed
+            # Warm-up requests populate the cache (the server refreshes it in
+            # the background) before any request is timed
+            samples, failures, response = await self._bench(
+                lambda: self._post_json("/api/v1/features/online", payload)
+            )
+            
+            data = self._decode(response)
+            # Pass if we get successful responses with features
+            # Source field is optional - it may not be set correctly in all environments
+            passed = failures == 0 and "features" in data
+            
+            p50, p95, p99 = self._percentiles_ms(samples)
+            latency_ok = p95 < self.cache_hit_target
+            source_info = data.get("source", "not_set")
+            
+            msg = (f"p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms over {len(samples)} requests "
+                   f"(target p95: <{self.cache_hit_target}ms), Source: {source_info}")
+            self.log_test("Online Serving (Cache Hit)", passed and latency_ok, p95, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Online Serving (Cache Hit)", False, duration_ms, str(e))
             return False
     
+    async def test_online_serving_wide(self):
+        """Test 16: Online serving, many features in one request vs one feature"""
+        start = time.perf_counter()
+        try:
+            narrow, narrow_failures, _ = await self._bench(
+                lambda: self._post_json("/api/v1/features/online", self._payloads["cache_hit"])
+            )
+            wide, wide_failures, response = await self._bench(
+                lambda: self._post_json("/api/v1/features/online", self._payloads["wide"])
+            )
+            
+            data = self._decode(response)
+            passed = narrow_failures == 0 and wide_failures == 0 and "features" in data
+            
+            narrow_p50 = self._percentiles_ms(narrow)[0]
+            wide_p50 = self._percentiles_ms(wide)[0]
+            ratio = wide_p50 / narrow_p50
+            ratio_ok = ratio < WIDE_LATENCY_RATIO
+            
+            msg = (f"K={len(WIDE_FEATURES)} p50={wide_p50:.2f}ms vs K=1 p50={narrow_p50:.2f}ms "
+                   f"({ratio:.2f}x, target: <{WIDE_LATENCY_RATIO}x)")
+            self.log_test("Online Serving (Wide)", passed and ratio_ok, wide_p50, msg)
+            return passed
+        except Exception as e:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.log_test("Online Serving (Wide)", False, duration_ms, str(e))
+            return False
+    
     async def test_batch_serving(self):
         """Test 7: Batch serving"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/features/batch",
-                    headers=self.headers,
-                    json={
-                        "entity_ids": ["user_1", "user_2", "user_3", "user_4", "user_5"],
-                        "feature_names": ["user_age", "user_lifetime_value"]
-                    }
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                data = response.json()
-                passed = response.status_code == 200 and "features" in data
-                
-                entity_count = len(data.get("features", {}))
-                msg = f"Retrieved {entity_count} entities"
-                self.log_test("Batch Serving", passed, duration_ms, msg)
-                return passed
+            response = await self._post_json("/api/v1/features/batch", self._payloads["batch_small"])
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            data = self._decode(response)
+            passed = response.status_code == 200 and "features" in data
+            
+            entity_count = len(data.get("features", {}))
+            msg = f"Retrieved {entity_count} entities"
+            self.log_test("Batch Serving", passed, duration_ms, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Batch Serving", False, duration_ms, str(e))
             return False
     
     async def test_batch_serving_large(self):
         """Test 8: Batch serving (large batch)"""
-        start = time.time()
+        start = time.perf_counter()
         try:
             # Test with 100 entities
-            entity_ids = [f"user_{i}" for i in range(1, 101)]
+            response = await self._post_json(
+                "/api/v1/features/batch",
+                self._payloads["batch_large"],
+                timeout=30.0
+            )
+            duration_ms = (time.perf_counter() - start) * 1000
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/features/batch",
-                    headers=self.headers,
-                    json={
-                        "entity_ids": entity_ids,
-                        "feature_names": ["user_age"]
-                    },
-                    timeout=30.0
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200
-                msg = f"100 entities in {duration_ms:.2f}ms"
-                self.log_test("Batch Serving (Large)", passed, duration_ms, msg)
-                return passed
+            passed = response.status_code == 200
+            msg = f"100 entities in {duration_ms:.2f}ms"
+            self.log_test("Batch Serving (Large)", passed, duration_ms, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Batch Serving (Large)", False, duration_ms, str(e))
             return False
     
-    async def test_cache_invalidation(self):
-        """Test 9: Cache invalidation"""
-        start = time.time()
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.delete(
-                    f"{self.base_url}/api/v1/cache/invalidate/user_1",
-                    headers=self.headers
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200 and response.json().get("status") == "success"
-                self.log_test("Cache Invalidation", passed, duration_ms)
-                return passed
-        except Exception as e:
-            duration_ms = (time.time() - start) * 1000
-            self.log_test("Cache Invalidation", False, duration_ms, str(e))
-            return False
-    
-    async def test_authentication_valid(self):
-        """Test 10: Authentication with valid key"""
-        start = time.time()
+    async def test_online_serving_concurrent(self):
+        """Test 15: Online serving (100 concurrent single-entity requests)"""
+        
+        # Encode the 100 bodies before the clock starts
+        bodies = [
+            orjson.dumps({"entity_id": entity_id, "feature_names": ["user_age"]})
+            for entity_id in self._user_ids_100
+        ]
+        
+        async def timed_request(body: bytes) -> Tuple[bool, float]:
+            request_start = time.perf_counter()
+            response = await self._post_json("/api/v1/features/online", body)
+            return response.status_code == 200, (time.perf_counter() - request_start) * 1000
+        
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/features",
-                    headers=self.headers
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200
-                self.log_test("Authentication (Valid Key)", passed, duration_ms)
-                return passed
+            outcomes = await asyncio.gather(*(timed_request(body) for body in bodies))
+            wall_ms = (time.perf_counter() - start) * 1000
+            
+            passed = all(ok for ok, _ in outcomes)
+            quantiles = statistics.quantiles([ms for _, ms in outcomes], n=100)
+            p50, p95, p99 = quantiles[49], quantiles[94], quantiles[98]
+            
+            # Logged duration is the per-request median so it's comparable
+            # with the single-request serving tests
+            msg = f"100 requests in {wall_ms:.2f}ms, p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms"
+            self.log_test("Online Serving (Concurrent)", passed, p50, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
-            self.log_test("Authentication (Valid Key)", False, duration_ms, str(e))
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.log_test("Online Serving (Concurrent)", False, duration_ms, str(e))
             return False
     
-    async def test_authentication_invalid(self):
-        """Test 11: Authentication with invalid key"""
-        start = time.time()
+    async def test_cache_invalidation(self):
+        """Test 9: Cache invalidation"""
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/features",
-                    headers={"X-API-Key": "invalid_key"}
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                # Should be rejected with 401
-                passed = response.status_code == 401
-                self.log_test("Authentication (Invalid Key)", passed, duration_ms)
-                return passed
+            response = await self.client.delete("/api/v1/cache/invalidate/user_1")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            passed = response.status_code == 200 and self._decode(response).get("status") == "success"
+            self.log_test("Cache Invalidation", passed, duration_ms)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
-            self.log_test("Authentication (Invalid Key)", False, duration_ms, str(e))
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.log_test("Cache Invalidation", False, duration_ms, str(e))
             return False
     
-    async def test_authentication_missing(self):
-        """Test 12: Authentication without key"""
-        start = time.time()
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/features"
-                )
-                duration_ms = (time.time() - start) * 1000
-                
-                # Should be rejected with 401
-                passed = response.status_code == 401
-                self.log_test("Authentication (Missing Key)", passed, duration_ms)
-                return passed
-        except Exception as e:
-            duration_ms = (time.time() - start) * 1000
-            self.log_test("Authentication (Missing Key)", False, duration_ms, str(e))
-            return False
+    async def test_authentication(self):
+        """Tests 10-12: Authentication with valid, invalid and missing keys"""
+        path = "/api/v1/features"
+        
+        # The shared client sends the key by default, so strip it for the missing case
+        missing_request = self.client.build_request("GET", path)
+        del missing_request.headers["X-API-Key"]
+        
+        cases = [
+            ("Authentication (Valid Key)", 200, self.client.get(path)),
+            ("Authentication (Invalid Key)", 401, self.client.get(path, headers={"X-API-Key": "invalid_key"})),
+            ("Authentication (Missing Key)", 401, self.client.send(missing_request)),
+        ]
+        
+        async def timed_request(request) -> Tuple[Union[httpx.Response, Exception], float]:
+            request_start = time.perf_counter()
+            try:
+                response = await request
+            except Exception as e:
+                response = e
+            return response, (time.perf_counter() - request_start) * 1000
+        
+        # The three checks are independent, so they share one round-trip's wall time
+        outcomes = await asyncio.gather(*(timed_request(request) for _, _, request in cases))
+        
+        results = []
+        for (name, expected_status, _), (response, duration_ms) in zip(cases, outcomes):
+            if isinstance(response, Exception):
+                self.log_test(name, False, duration_ms, str(response))
+                results.append(False)
+                continue
+            
+            passed = response.status_code == expected_status
+            self.log_test(name, passed, duration_ms)
+            results.append(passed)
+        return results
     
     async def test_metrics_endpoint(self):
         """Test 13: Prometheus metrics"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{self.base_url}/metrics")
-                duration_ms = (time.time() - start) * 1000
-                
-                # Metrics endpoint should return 200 and text content
-                text = response.text
-                
-                # Check for Prometheus format
-                has_prometheus_format = "# HELP" in text or "# TYPE" in text
-                
-                # Check for our specific metrics (case sensitive, look in lines)
-                lines = text.lower()  # Make case-insensitive
-                has_requests = "feature_store_api_requests" in lines
-                has_latency = "feature_store_api_latency" in lines or "feature_store" in lines
-                has_cache = "feature_store_cache" in lines or "cache_hits" in lines or "cache_misses" in lines
-                
-                # Pass if endpoint works and returns Prometheus format
-                passed = response.status_code == 200 and (has_prometheus_format or len(text) > 1000)
-                
-                msg = f"Endpoint OK, has Prometheus format: {has_prometheus_format}, Size: {len(text)} bytes"
-                self.log_test("Metrics Endpoint", passed, duration_ms, msg)
-                return passed
+            response = await self.client.get("/metrics")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            # Metrics endpoint should return 200 and text content
+            text = response.text
+            
+            # Check for Prometheus format
+            has_prometheus_format = "# HELP" in text or "# TYPE" in text
+            
+            # Check for our specific metrics (case sensitive, look in lines)
+            lines = text.lower()  # Make case-insensitive
+            has_requests = "feature_store_api_requests" in lines
+            has_latency = "feature_store_api_latency" in lines or "feature_store" in lines
+            has_cache = "feature_store_cache" in lines or "cache_hits" in lines or "cache_misses" in lines
+            
+            # Pass if endpoint works and returns Prometheus format
+            passed = response.status_code == 200 and (has_prometheus_format or len(text) > 1000)
+            
+            msg = f"Endpoint OK, has Prometheus format: {has_prometheus_format}, Size: {len(text)} bytes"
+            self.log_test("Metrics Endpoint", passed, duration_ms, msg)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("Metrics Endpoint", False, duration_ms, str(e))
             return False
     
     async def test_api_documentation(self):
         """Test 14: API documentation"""
-        start = time.time()
+        start = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(f"{self.base_url}/docs")
-                duration_ms = (time.time() - start) * 1000
-                
-                passed = response.status_code == 200 and "swagger" in response.text.lower()
-                self.log_test("API Documentation", passed, duration_ms)
-                return passed
+            response = await self.client.get("/docs")
+            duration_ms = (time.perf_counter() - start) * 1000
+            
+            passed = response.status_code == 200 and "swagger" in response.text.lower()
+            self.log_test("API Documentation", passed, duration_ms)
+            return passed
         except Exception as e:
-            duration_ms = (time.time() - start) * 1000
+            duration_ms = (time.perf_counter() - start) * 1000
             self.log_test("API Documentation", False, duration_ms, str(e))
             return False
     
     async def run_all_tests(self):
-        """Run all tests sequentially"""
+        """Run all tests"""
         print("\n" + "="*80)
         print("FEATURE STORE - AUTOMATED TEST SUITE")
         print("="*80 + "\n")
         
-        test_start = time.time()
+        test_start = time.perf_counter()
         
-        # Run tests sequentially for predictable order and to allow metrics to accumulate
-        results = []
-        
-        tests = [
+        # Tests that don't depend on each other and aren't latency-sensitive
+        # run concurrently
+        independent_tests = [
             ("Health Check", self.test_health_check),
             ("Readiness Check", self.test_readiness_check),
+            ("Authentication", self.test_authentication),
+            ("API Documentation", self.test_api_documentation),
+        ]
+        
+        # The rest run sequentially: register before list, cache miss before hit,
+        # invalidate after the hit, and metrics last so they have accumulated.
+        # Serving latencies are measured without competing requests in flight
+        ordered_tests = [
             ("Feature Registration", self.test_feature_registration),
             ("List Features", self.test_list_features),
             ("Online Serving (Cache Miss)", self.test_online_serving_cache_miss),
             ("Online Serving (Cache Hit)", self.test_online_serving_cache_hit),
+            ("Online Serving (Wide)", self.test_online_serving_wide),
             ("Batch Serving", self.test_batch_serving),
             ("Batch Serving (Large)", self.test_batch_serving_large),
+            ("Online Serving (Concurrent)", self.test_online_serving_concurrent),
             ("Cache Invalidation", self.test_cache_invalidation),
-            ("Authentication (Valid Key)", self.test_authentication_valid),
-            ("Authentication (Invalid Key)", self.test_authentication_invalid),
-            ("Authentication (Missing Key)", self.test_authentication_missing),
             ("Metrics Endpoint", self.test_metrics_endpoint),
-            ("API Documentation", self.test_api_documentation),
         ]
         
-        for name, test_func in tests:
-            result = await test_func()
-            results.append(result)
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                if self._app is not None:
+                    # ASGITransport doesn't send lifespan events, so run the
+                    # app's startup/shutdown (pool connects) around the tests
+                    await stack.enter_async_context(self._app.router.lifespan_context(self._app))
+                await stack.enter_async_context(self.client)
+                
+                results = []
+                # test_authentication reports its three checks as a list
+                for result in await asyncio.gather(*(fn() for _, fn in independent_tests)):
+                    results.extend(result if isinstance(result, list) else [result])
+                for name, test_func in ordered_tests:
+                    result = await test_func()
+                    results.append(result)
+        finally:
+            self.flush_log()
         
-        total_duration = time.time() - test_start
+        total_duration = time.perf_counter() - test_start
         
         # Print summary
         print("\n" + "="*80)
@@ -446,21 +626,32 @@ class FeatureStoreTestSuite:
             print(f"  Min Latency: {min(latencies):.2f}ms")
             print(f"  Max Latency: {max(latencies):.2f}ms")
         
-        # Save results to file
-        with open("test_results.json", "w") as f:
-            json.dump({
-                "summary": {
-                    "total": total,
-                    "passed": passed,
-                    "failed": total - passed,
-                    "pass_rate": pass_rate,
-                    "duration_seconds": total_duration,
-                    "timestamp": datetime.now().isoformat()
-                },
-                "tests": self.results
-            }, f, indent=2)
-        
-        print("\nDetailed results saved to: test_results.json")
+        # Save results to file (encoded once, optionally also gzipped)
+        encoded = orjson.dumps({
+            "summary": {
+                "total": total,
+                "passed": passed,
+                "failed": total - passed,
+                "pass_rate": pass_rate,
+                "duration_seconds": total_duration,
+                "timestamp": datetime.now().isoformat()
+            },
+            "tests": [
+                {
+                    **r,
+                    "duration_ms": round(r["duration_ms"], 2),
+                    "timestamp": datetime.fromtimestamp(r["timestamp"] / 1e9).isoformat()
+                }
+                for r in self.results
+            ]
+        }, option=orjson.OPT_INDENT_2)
+        with open("test_results.json", "wb") as f:
+            f.write(encoded)
+        if self.gzip_results:
+            with gzip.open("test_results.json.gz", "wb", compresslevel=1) as f:
+                f.write(encoded)
+        
+        print("\nDetailed results saved to: test_results.json" + (" (+ .gz)" if self.gzip_results else ""))
         print("="*80 + "\n")
         
         return pass_rate == 100.0
@@ -471,19 +662,39 @@ async def main():
     import sys
     import platform
     
-    # Parse arguments
-    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
-    api_key = sys.argv[2] if len(sys.argv) > 2 else "tenant1_key"
-    windows_mode = sys.argv[3].lower() == "--windows" if len(sys.argv) > 3 else platform.system() == "Windows"
+    # Parse arguments: positional base URL and API key, plus --windows / --msgpack / --gzip / --in-process flags
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = {a.lower() for a in sys.argv[1:] if a.startswith("--")}
+    base_url = args[0] if len(args) > 0 else "http://localhost:8000"
+    api_key = args[1] if len(args) > 1 else "tenant1_key"
+    windows_mode = "--windows" in flags or platform.system() == "Windows"
+    use_msgpack = "--msgpack" in flags
+    gzip_results = "--gzip" in flags
+    in_process = "--in-process" in flags
     
-    print(f"Testing Feature Store at: {base_url}")
+    missing = missing_c_extensions()
+    if missing:
+        print("!" * 80)
+        print(f"WARNING: C extensions not loaded: {', '.join(missing)}")
+        print("         Latencies will be measured against pure-Python fallbacks.")
+        print("         Reinstall with: pip install --only-binary=:all: -r requirements.txt")
+        print("!" * 80 + "\n")
+    
+    if in_process:
+        print("Testing Feature Store in-process (ASGI transport, no network)")
+    else:
+        print(f"Testing Feature Store at: {base_url}")
     print(f"Using API Key: {api_key}")
     if windows_mode:
         print(f"Platform: Windows (using relaxed latency targets)")
     print()
     
     # Run tests
-    suite = FeatureStoreTestSuite(base_url=base_url, api_key=api_key, windows_mode=windows_mode)
+    suite = FeatureStoreTestSuite(
+        base_url=base_url, api_key=api_key,
+        windows_mode=windows_mode, use_msgpack=use_msgpack,
+        gzip_results=gzip_results, in_process=in_process
+    )
     success = await suite.run_all_tests()
     
     # Exit with appropriate code
@@ -491,4 +702,11 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop is optional (not available on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     asyncio.run(main())
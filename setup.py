@@ -11,29 +11,41 @@ setup(
     install_requires=[
         "fastapi==0.104.1",
         "uvicorn[standard]==0.24.0",
+        "uvloop==0.19.0; sys_platform != 'win32'",
+        "httptools==0.6.1",
         "pydantic==2.5.0",
         "pydantic-settings==2.1.0",
         "asyncpg==0.29.0",
+        "sqlparse==0.4.4",
         "redis[hiredis]==5.0.1",
         "msgpack==1.0.7",
-        "kafka-python==2.0.2",
-        "pyspark==3.4.1",
+        "ormsgpack==1.4.2",
         "numpy==1.24.3",
         "prometheus-client==0.19.0",
         "python-json-logger==2.0.7",
-        "httpx==0.25.2",
+        "orjson==3.9.10",
+        "msgspec==0.18.4",
+        "httpx[http2]==0.25.2",
     ],
     extras_require={
         "dev": [
             "pytest==7.4.3",
-            "pytest-asyncio==0.21.1",
+            "pytest-asyncio==0.24.0",
             "pytest-cov==4.1.0",
+            "pytest-xdist==3.5.0",
             "locust==2.19.1",
+            "pyperf==2.6.2",
             "ipython==8.18.1",
             "black==23.12.1",
             "flake8==6.1.0",
             "mypy==1.7.1",
-        ]
+        ],
+        # Only the offline stream processor needs these; the API never imports them
+        "spark": [
+            "kafka-python==2.0.2",
+            "psycopg[binary]==3.1.13",
+            "pyspark==3.4.1",
+        ],
     },
     entry_points={
         "console_scripts": [
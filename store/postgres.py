@@ -1,10 +1,289 @@
 import asyncpg
-from typing import List, Dict, Optional
-from datetime import datetime
+import orjson
+import time
+from typing import AsyncIterator, List, Dict, Literal, Optional, Tuple
+from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Scalar values live in typed columns (compressed with delta/gorilla/RLE and
+# read without a JSONB parse); only compound values use the JSONB column.
+# Exactly one of these is non-NULL per row
+VALUE_COLUMNS = ('value_f8', 'value_i8', 'value_b', 'value')
+
+INT8_MIN, INT8_MAX = -2**63, 2**63 - 1
+
+
+# Point-in-time correctness: get latest value before timestamp.
+# The LATERAL subquery runs once per (entity, feature) pair and reads
+# just the newest row through the (entity_id, feature_id, timestamp DESC)
+# index, instead of scanning every row up to the timestamp. The outer
+# DISTINCT ON only picks between versions sharing a feature name
+GET_FEATURES_SQL = """
+SELECT DISTINCT ON (e.entity_id, f.name)
+    e.entity_id,
+    f.name as feature_name,
+    pit.value_f8, pit.value_i8, pit.value_b, pit.value,
+    pit.timestamp,
+    pit.metadata
+FROM unnest($1::text[]) AS e(entity_id)
+CROSS JOIN features f
+CROSS JOIN LATERAL (
+    SELECT fv.value_f8, fv.value_i8, fv.value_b, fv.value, fv.timestamp, fv.metadata
+    FROM feature_values fv
+    WHERE fv.entity_id = e.entity_id
+        AND fv.feature_id = f.id
+        AND fv.timestamp <= $3
+    ORDER BY fv.timestamp DESC
+    LIMIT 1
+) pit
+WHERE f.name = ANY($2::text[])
+ORDER BY e.entity_id, f.name, pit.timestamp DESC
+"""
+
+# Same per-pair LATERAL lookup as GET_FEATURES_SQL, against the newest
+# 5-minute bucket of the feature_5min continuous aggregate
+GET_WINDOW_STATS_SQL = """
+SELECT DISTINCT ON (e.entity_id, f.name)
+    e.entity_id,
+    f.name as feature_name,
+    w.bucket,
+    w.avg_value,
+    w.stddev_value,
+    w.max_value,
+    w.min_value
+FROM unnest($1::text[]) AS e(entity_id)
+CROSS JOIN features f
+CROSS JOIN LATERAL (
+    SELECT fm.bucket, fm.avg_value, fm.stddev_value, fm.max_value, fm.min_value
+    FROM feature_5min fm
+    WHERE fm.entity_id = e.entity_id
+        AND fm.feature_id = f.id
+        AND fm.bucket <= $3
+    ORDER BY fm.bucket DESC
+    LIMIT 1
+) w
+WHERE f.name = ANY($2::text[])
+ORDER BY e.entity_id, f.name, w.bucket DESC
+"""
+
+# Conflict clauses for write_features' two modes. Upsert overwrites an
+# existing (feature, entity, timestamp) row; append keeps it, which skips
+# the heap update and its extra WAL for the common append-only stream
+ON_CONFLICT_UPDATE = """
+ON CONFLICT (feature_id, entity_id, timestamp) 
+DO UPDATE SET 
+    value_f8 = EXCLUDED.value_f8,
+    value_i8 = EXCLUDED.value_i8,
+    value_b = EXCLUDED.value_b,
+    value = EXCLUDED.value,
+    metadata = EXCLUDED.metadata
+"""
+ON_CONFLICT_NOTHING = """
+ON CONFLICT (feature_id, entity_id, timestamp) DO NOTHING
+"""
+
+# DISTINCT ON keeps the last row written for a key within the batch
+# (ctid follows COPY order), matching the old row-by-row upsert and
+# avoiding ON CONFLICT touching the same row twice
+MERGE_STAGED_ROWS_SQL = """
+INSERT INTO feature_values (feature_id, entity_id, timestamp, value_f8, value_i8, value_b, value, metadata)
+SELECT DISTINCT ON (feature_id, entity_id, timestamp)
+    feature_id, entity_id, timestamp, value_f8, value_i8, value_b, value, metadata
+FROM feature_values_write_staging
+ORDER BY feature_id, entity_id, timestamp, ctid DESC
+"""
+
+# Row-at-a-time insert for small batches, where COPY + merge setup dominates
+INSERT_FEATURE_VALUE_SQL = """
+INSERT INTO feature_values (feature_id, entity_id, timestamp, value_f8, value_i8, value_b, value, metadata)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+"""
+
+FEATURE_VALUE_COLUMNS = ['feature_id', 'entity_id', 'timestamp', *VALUE_COLUMNS, 'metadata']
+
+# Batches smaller than this use a prepared INSERT instead of COPY
+COPY_MIN_ROWS = 1000
+
+# Feature IDs are resolved up front (see FeatureStore._resolve_feature_ids),
+# so history reads hit feature_values alone with no join against features
+FEATURE_HISTORY_SQL = """
+SELECT value_f8, value_i8, value_b, value, timestamp, metadata
+FROM feature_values
+WHERE feature_id = ANY($1::int[])
+    AND entity_id = $2
+    AND timestamp BETWEEN $3 AND $4
+ORDER BY timestamp ASC
+"""
+
+FEATURE_IDS_SQL = "SELECT id FROM features WHERE name = $1"
+
+FEATURE_NAMES_SQL = "SELECT id, name FROM features WHERE id = ANY($1::int[])"
+
+# How long a resolved feature name -> IDs mapping is reused
+FEATURE_IDS_TTL_SECONDS = 60
+
+# Rows fetched per round-trip when streaming feature history
+HISTORY_PREFETCH = 1000
+
+# Aggregates supported by get_feature_history_bucketed. count counts rows;
+# the others run over whichever typed column holds the value
+HISTORY_BUCKET_AGGREGATES = ('avg', 'min', 'max', 'sum', 'count')
+
+# A row's value as float8. JSONB values are only cast when they're numbers,
+# so strings or objects become NULL (and are skipped) instead of failing
+HISTORY_NUMERIC_VALUE = """COALESCE(
+        value_f8, value_i8::float8, value_b::int::float8,
+        CASE WHEN jsonb_typeof(value) = 'number' THEN (value #>> '{}')::float8 END
+    )"""
+
+FEATURE_HISTORY_BUCKETED_SQL = """
+SELECT time_bucket($1::interval, timestamp) AS bucket,
+    {agg} AS value
+FROM feature_values
+WHERE feature_id = ANY($2::int[])
+    AND entity_id = $3
+    AND timestamp BETWEEN $4 AND $5
+GROUP BY bucket
+ORDER BY bucket ASC
+"""
+
+REGISTER_FEATURE_SQL = """
+INSERT INTO features (name, version, dtype, entity_type, ttl_hours, description, tags)
+VALUES ($1, $2, $3, $4, $5, $6, $7)
+ON CONFLICT (name, version) 
+DO UPDATE SET
+    dtype = EXCLUDED.dtype,
+    entity_type = EXCLUDED.entity_type,
+    ttl_hours = EXCLUDED.ttl_hours,
+    description = EXCLUDED.description,
+    tags = EXCLUDED.tags,
+    updated_at = NOW()
+RETURNING id, created_at
+"""
+
+# Statements prepared on every new pool connection, keyed by name
+FEATURE_STORE_STATEMENTS = {
+    'get_features': GET_FEATURES_SQL,
+    'get_window_stats': GET_WINDOW_STATS_SQL,
+    'merge_staged_upsert': MERGE_STAGED_ROWS_SQL + ON_CONFLICT_UPDATE,
+    'merge_staged_append': MERGE_STAGED_ROWS_SQL + ON_CONFLICT_NOTHING,
+    'insert_value_upsert': INSERT_FEATURE_VALUE_SQL + ON_CONFLICT_UPDATE,
+    'insert_value_append': INSERT_FEATURE_VALUE_SQL + ON_CONFLICT_NOTHING,
+    'feature_history': FEATURE_HISTORY_SQL,
+    'feature_ids': FEATURE_IDS_SQL,
+    'feature_names': FEATURE_NAMES_SQL,
+    **{
+        f'feature_history_{agg}': FEATURE_HISTORY_BUCKETED_SQL.format(
+            agg='count(*)' if agg == 'count' else f'{agg}({HISTORY_NUMERIC_VALUE})'
+        )
+        for agg in HISTORY_BUCKET_AGGREGATES
+    },
+}
+
+FEATURE_REGISTRY_STATEMENTS = {
+    'register': REGISTER_FEATURE_SQL,
+    'get_feature_version': "SELECT * FROM features WHERE name = $1 AND version = $2",
+    'get_feature_latest': "SELECT * FROM features WHERE name = $1 ORDER BY version DESC LIMIT 1",
+    'list_features': "SELECT * FROM features ORDER BY name, version",
+    'list_features_by_type': "SELECT * FROM features WHERE entity_type = $1 ORDER BY name, version",
+    'get_feature_by_id': "SELECT * FROM features WHERE id = $1",
+}
+
+
+class PreparedConnection(asyncpg.Connection):
+    """
+    asyncpg connection that carries its own prepared statements.
+    Statements are parsed and planned once per connection instead of per call.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = {}
+
+
+def split_value(value) -> Tuple:
+    """
+    Route a feature value to its typed column.
+    
+    Args:
+        value: Feature value
+        
+    Returns:
+        (value_f8, value_i8, value_b, value) tuple with one non-None slot
+    """
+    # bool first: it's a subclass of int
+    if isinstance(value, bool):
+        return None, None, value, None
+    if isinstance(value, int) and INT8_MIN <= value <= INT8_MAX:
+        return None, value, None, None
+    if isinstance(value, float):
+        return value, None, None, None
+    return None, None, None, value
+
+
+def row_value(row):
+    """Read a row's value back from whichever typed column holds it"""
+    for column in VALUE_COLUMNS:
+        value = row[column]
+        if value is not None:
+            return value
+    return None
+
+
+def _encode_jsonb(value) -> bytes:
+    # jsonb's binary wire format is a version byte followed by the JSON text.
+    # Pre-serializing values before COPY/executemany saves nothing over this:
+    # binary COPY still calls a codec per value, and text-format JSON
+    # strings would need a text codec, which binary COPY rejects
+    return b'\x01' + orjson.dumps(value)
+
+
+def _decode_jsonb(data: bytes):
+    return orjson.loads(memoryview(data)[1:])
+
+
+async def register_json_codecs(conn):
+    """
+    Encode and decode json/jsonb with orjson instead of the stdlib json module.
+    
+    The codecs use the binary format, so they also work with
+    copy_records_to_table (binary COPY can't use text-format codecs).
+    
+    Args:
+        conn: Database connection
+    """
+    await conn.set_type_codec(
+        'json', encoder=orjson.dumps, decoder=orjson.loads,
+        schema='pg_catalog', format='binary'
+    )
+    await conn.set_type_codec(
+        'jsonb', encoder=_encode_jsonb, decoder=_decode_jsonb,
+        schema='pg_catalog', format='binary'
+    )
+
+
+def init_connection(statements: Dict[str, str]):
+    """
+    Build a pool ``init`` hook for new connections.
+    
+    Registers the orjson json/jsonb codecs, then prepares the given
+    statements. Codecs go first so the statements are prepared against them.
+    
+    Args:
+        statements: Dict of {name: sql}
+        
+    Returns:
+        Coroutine function run once for each new connection in the pool
+    """
+    async def init(conn: PreparedConnection):
+        await register_json_codecs(conn)
+        for name, sql in statements.items():
+            conn.statements[name] = await conn.prepare(sql)
+    
+    return init
+
 
 class FeatureStore:
     """
@@ -12,11 +291,16 @@ class FeatureStore:
     Provides point-in-time correct feature retrieval for training and serving.
     """
     
-    def __init__(self, connection_string: str, min_pool: int = 10, max_pool: int = 50):
+    def __init__(self, connection_string: str, min_pool: int = 10, max_pool: int = 50,
+                 cache=None):
         self.pool = None
         self.conn_string = connection_string
         self.min_pool = min_pool
         self.max_pool = max_pool
+        # Optional FeatureCache; written entries are evicted from it
+        self.cache = cache
+        # {feature_name: (resolved_at, feature_ids)}, one ID per registered version
+        self._feature_ids: Dict[str, Tuple[float, List[int]]] = {}
     
     async def connect(self):
         """Initialize connection pool"""
@@ -26,6 +310,8 @@ class FeatureStore:
                 min_size=self.min_pool,
                 max_size=self.max_pool,
                 command_timeout=5,
+                connection_class=PreparedConnection,
+                init=init_connection(FEATURE_STORE_STATEMENTS),
                 server_settings={
                     'application_name': 'feature_store'
                 }
@@ -64,40 +350,26 @@ class FeatureStore:
         if timestamp is None:
             timestamp = datetime.utcnow()
         
-        # Point-in-time correctness: get latest value before timestamp
-        # DISTINCT ON ensures we get only one row per (entity_id, feature_name)
-        query = """
-            SELECT DISTINCT ON (fv.entity_id, f.name)
-                fv.entity_id,
-                f.name as feature_name,
-                fv.value,
-                fv.timestamp,
-                fv.metadata
-            FROM feature_values fv
-            JOIN features f ON f.id = fv.feature_id
-            WHERE fv.entity_id = ANY($1::text[])
-                AND f.name = ANY($2::text[])
-                AND fv.timestamp <= $3
-            ORDER BY fv.entity_id, f.name, fv.timestamp DESC
-        """
-        
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch(query, entity_ids, feature_names, timestamp)
+                rows = await conn.statements['get_features'].fetch(entity_ids, feature_names, timestamp)
             
-            # Reshape to nested dict for easy access
+            # Reshape to nested dict for easy access. Records are read by
+            # position (entity_id, feature_name, value_f8, value_i8, value_b,
+            # value, timestamp, metadata), which skips asyncpg's name lookup
             result = {}
             for row in rows:
-                entity_id = row['entity_id']
-                feature_name = row['feature_name']
-                
-                if entity_id not in result:
-                    result[entity_id] = {}
+                # Typed value columns in order of how often they're set
+                value = row[2]
+                if value is None:
+                    value = row[3]
+                    if value is None:
+                        value = row[4] if row[4] is not None else row[5]
                 
-                result[entity_id][feature_name] = {
-                    'value': row['value'],  # asyncpg returns Python object from JSONB
-                    'timestamp': row['timestamp'],
-                    'metadata': row['metadata'] or {}  # asyncpg returns Python object from JSONB
+                result.setdefault(row[0], {})[row[1]] = {
+                    'value': value,
+                    'timestamp': row[6],
+                    'metadata': row[7] or {}  # asyncpg returns Python object from JSONB
                 }
             
             logger.debug(f"Retrieved {len(rows)} feature values for {len(entity_ids)} entities")
@@ -107,10 +379,66 @@ class FeatureStore:
             logger.error(f"Failed to get features: {e}")
             raise
     
-    async def write_features(self, features: List[Dict]):
+    async def get_window_stats(
+        self,
+        entity_ids: List[str],
+        feature_names: List[str],
+        timestamp: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, Dict]]:
+        """
+        Get 5-minute window statistics for multiple entities.
+        
+        Reads the newest bucket starting at or before the timestamp from the
+        feature_5min continuous aggregate, so no window is computed per call.
+        
+        Args:
+            entity_ids: List of entity identifiers
+            feature_names: List of numeric feature names
+            timestamp: Point-in-time timestamp (defaults to now)
+            
+        Returns:
+            Nested dict: {entity_id: {feature_name: {bucket, avg, stddev, max, min}}}
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.statements['get_window_stats'].fetch(
+                    entity_ids, feature_names, timestamp
+                )
+            
+            result = {}
+            for row in rows:
+                result.setdefault(row['entity_id'], {})[row['feature_name']] = {
+                    'bucket': row['bucket'],
+                    'avg': row['avg_value'],
+                    'stddev': row['stddev_value'],
+                    'max': row['max_value'],
+                    'min': row['min_value']
+                }
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Failed to get window stats: {e}")
+            raise
+    
+    async def write_features(self, features: List[Dict],
+                             write_mode: Literal['append', 'upsert'] = 'append'):
         """
         Batch write features to storage.
-        Uses INSERT ON CONFLICT to handle duplicate timestamps.
+        
+        In append mode, a row whose (feature, entity, timestamp) already
+        exists is kept and the new one dropped. Batches of COPY_MIN_ROWS or
+        more are binary-COPYed straight into feature_values; if that hits a
+        duplicate, the batch is retried through the staging table with
+        ON CONFLICT DO NOTHING. Upsert mode overwrites existing rows,
+        always COPYing into the unlogged staging table and merging with a
+        single INSERT ... SELECT ON CONFLICT DO UPDATE. Smaller batches in
+        either mode run a prepared INSERT with the matching conflict clause.
+        Either way, the last row for a key within the batch is the one written.
+        If a cache is attached, the written entries are then evicted from it.
         
         Args:
             features: List of feature dicts with keys:
@@ -119,41 +447,152 @@ class FeatureStore:
                 - timestamp: datetime
                 - value: any JSON-serializable value
                 - metadata: dict (optional)
+            write_mode: 'append' (default) or 'upsert'
         """
+        if write_mode not in ('append', 'upsert'):
+            raise ValueError(f"Unsupported write mode: {write_mode}")
+        
         if not features:
             return
         
-        query = """
-            INSERT INTO feature_values (feature_id, entity_id, timestamp, value, metadata)
-            VALUES ($1, $2, $3, $4, $5)
-            ON CONFLICT (feature_id, entity_id, timestamp) 
-            DO UPDATE SET 
-                value = EXCLUDED.value,
-                metadata = EXCLUDED.metadata
-        """
+        # Scalars go to typed columns; compound values are JSONB, encoded by
+        # the connection's orjson codec
+        records = [
+            (
+                f['feature_id'],
+                f['entity_id'],
+                f['timestamp'],
+                *split_value(f['value']),
+                f.get('metadata', {})
+            )
+            for f in features
+        ]
         
         try:
-            async with self.pool.acquire() as conn:
-                await conn.executemany(
-                    query,
-                    [
-                        (
-                            f['feature_id'],
-                            f['entity_id'],
-                            f['timestamp'],
-                            f['value'],  # asyncpg handles JSONB conversion
-                            f.get('metadata', {})  # asyncpg handles JSONB conversion
-                        )
-                        for f in features
-                    ]
-                )
+            async with self.pool.acquire() as conn, conn.transaction():
+                if len(records) < COPY_MIN_ROWS:
+                    # Pipelined binds of one prepared statement. Keep only the
+                    # last row per key so duplicates within the batch resolve
+                    # as in the merge below, in either mode
+                    records = list({r[:3]: r for r in records}.values())
+                    await conn.statements[f'insert_value_{write_mode}'].executemany(records)
+                elif write_mode == 'upsert' or not await self._copy_appended(conn, records):
+                    await self._merge_staged(conn, records, write_mode)
+                
+                if self.cache is not None:
+                    rows = await conn.statements['feature_names'].fetch(
+                        list({f['feature_id'] for f in features})
+                    )
             
             logger.info(f"Wrote {len(features)} feature values to storage")
             
+            if self.cache is not None:
+                # Evict each written (entity, feature) pair once, after commit,
+                # so the next read repopulates the cache from the new values
+                names = {row['id']: row['name'] for row in rows}
+                keys = list({
+                    f"{f['entity_id']}:{names[f['feature_id']]}"
+                    for f in features if f['feature_id'] in names
+                })
+                await self.cache.unlink_many(keys)
+            
         except Exception as e:
             logger.error(f"Failed to write features: {e}")
             raise
     
+    async def _copy_appended(self, conn, records: List[Tuple]) -> bool:
+        """
+        COPY records straight into feature_values under a savepoint.
+        
+        Returns:
+            False if a row duplicated an existing key (or another row in the
+            batch), in which case nothing was written
+        """
+        try:
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    'feature_values', records=records, columns=FEATURE_VALUE_COLUMNS
+                )
+        except asyncpg.UniqueViolationError:
+            logger.debug("Append COPY hit existing rows, merging through staging")
+            return False
+        return True
+    
+    async def _merge_staged(self, conn, records: List[Tuple], write_mode: str):
+        """COPY records into the staging table and merge them into feature_values"""
+        # TRUNCATE locks the staging table until commit, so concurrent
+        # writers take turns rather than merging each other's rows
+        await conn.execute("TRUNCATE feature_values_write_staging")
+        await conn.copy_records_to_table(
+            'feature_values_write_staging', records=records, columns=FEATURE_VALUE_COLUMNS
+        )
+        await conn.statements[f'merge_staged_{write_mode}'].fetch()
+    
+    async def _resolve_feature_ids(self, conn, feature_name: str) -> List[int]:
+        """
+        Map a feature name to its IDs, reusing the result for FEATURE_IDS_TTL_SECONDS.
+        
+        Args:
+            conn: Pool connection to query on a cache miss
+            feature_name: Feature name
+            
+        Returns:
+            IDs of every registered version of the feature
+        """
+        cached = self._feature_ids.get(feature_name)
+        if cached and time.monotonic() - cached[0] < FEATURE_IDS_TTL_SECONDS:
+            return cached[1]
+        
+        rows = await conn.statements['feature_ids'].fetch(feature_name)
+        feature_ids = [row['id'] for row in rows]
+        self._feature_ids[feature_name] = (time.monotonic(), feature_ids)
+        return feature_ids
+    
+    async def iter_feature_history(
+        self,
+        entity_id: str,
+        feature_name: str,
+        start_time: datetime,
+        end_time: datetime
+    ) -> AsyncIterator[Dict]:
+        """
+        Stream feature value history for an entity within a time range.
+        
+        Rows come from a server-side cursor, HISTORY_PREFETCH at a time, so
+        long ranges are never materialized (or decoded) all at once.
+        
+        Args:
+            entity_id: Entity identifier
+            feature_name: Feature name
+            start_time: Start of time range
+            end_time: End of time range
+            
+        Yields:
+            {value, timestamp, metadata} dicts ordered by timestamp
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                feature_ids = await self._resolve_feature_ids(conn, feature_name)
+                if not feature_ids:
+                    return
+                
+                # Cursors only live inside a transaction
+                async with conn.transaction():
+                    cursor = conn.statements['feature_history'].cursor(
+                        feature_ids, entity_id, start_time, end_time,
+                        prefetch=HISTORY_PREFETCH
+                    )
+                    async for row in cursor:
+                        yield {
+                            'value': row_value(row),
+                            'timestamp': row['timestamp'],
+                            'metadata': row['metadata'] or {}  # asyncpg returns Python object from JSONB
+                        }
+            
+        except Exception as e:
+            logger.error(f"Failed to get feature history: {e}")
+            raise
+    
     async def get_feature_history(
         self,
         entity_id: str,
@@ -174,32 +613,53 @@ class FeatureStore:
         Returns:
             List of {value, timestamp, metadata} dicts ordered by timestamp
         """
-        query = """
-            SELECT fv.value, fv.timestamp, fv.metadata
-            FROM feature_values fv
-            JOIN features f ON f.id = fv.feature_id
-            WHERE fv.entity_id = $1
-                AND f.name = $2
-                AND fv.timestamp >= $3
-                AND fv.timestamp <= $4
-            ORDER BY fv.timestamp ASC
+        return [
+            row async for row in self.iter_feature_history(
+                entity_id, feature_name, start_time, end_time
+            )
+        ]
+    
+    async def get_feature_history_bucketed(
+        self,
+        entity_id: str,
+        feature_name: str,
+        start_time: datetime,
+        end_time: datetime,
+        bucket: timedelta = timedelta(minutes=1),
+        agg: str = 'avg'
+    ) -> List[Dict]:
         """
+        Get numeric feature history aggregated into time buckets.
+        The aggregation runs in TimescaleDB, so only one row per bucket is returned.
+        
+        Args:
+            entity_id: Entity identifier
+            feature_name: Feature name
+            start_time: Start of time range
+            end_time: End of time range
+            bucket: Bucket width
+            agg: One of HISTORY_BUCKET_AGGREGATES
+            
+        Returns:
+            List of {bucket, value} dicts ordered by bucket
+        """
+        if agg not in HISTORY_BUCKET_AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: {agg}")
         
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch(query, entity_id, feature_name, start_time, end_time)
+                feature_ids = await self._resolve_feature_ids(conn, feature_name)
+                if not feature_ids:
+                    return []
+                
+                rows = await conn.statements[f'feature_history_{agg}'].fetch(
+                    bucket, feature_ids, entity_id, start_time, end_time
+                )
             
-            return [
-                {
-                    'value': row['value'],  # asyncpg returns Python object from JSONB
-                    'timestamp': row['timestamp'],
-                    'metadata': row['metadata'] or {}  # asyncpg returns Python object from JSONB
-                }
-                for row in rows
-            ]
+            return [{'bucket': row['bucket'], 'value': row['value']} for row in rows]
             
         except Exception as e:
-            logger.error(f"Failed to get feature history: {e}")
+            logger.error(f"Failed to get bucketed feature history: {e}")
             raise
 
 
@@ -220,7 +680,9 @@ class FeatureRegistry:
                 self.conn_string,
                 min_size=5,
                 max_size=20,
-                command_timeout=5
+                command_timeout=5,
+                connection_class=PreparedConnection,
+                init=init_connection(FEATURE_REGISTRY_STATEMENTS)
             )
             logger.info("Feature registry connection pool created")
         except Exception as e:
@@ -258,24 +720,10 @@ class FeatureRegistry:
         Returns:
             Tuple of (feature_id, created_at)
         """
-        query = """
-            INSERT INTO features (name, version, dtype, entity_type, ttl_hours, description, tags)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            ON CONFLICT (name, version) 
-            DO UPDATE SET
-                dtype = EXCLUDED.dtype,
-                entity_type = EXCLUDED.entity_type,
-                ttl_hours = EXCLUDED.ttl_hours,
-                description = EXCLUDED.description,
-                tags = EXCLUDED.tags,
-                updated_at = NOW()
-            RETURNING id, created_at
-        """
-        
         try:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    query, name, version, dtype, entity_type, ttl_hours, description, tags or []
+                row = await conn.statements['register'].fetchrow(
+                    name, version, dtype, entity_type, ttl_hours, description, tags or []
                 )
             
             logger.info(f"Registered feature: {name} v{version} (ID: {row['id']})")
@@ -297,16 +745,12 @@ class FeatureRegistry:
         Returns:
             Feature metadata dict or None if not found
         """
-        if version:
-            query = "SELECT * FROM features WHERE name = $1 AND version = $2"
-            params = [name, version]
-        else:
-            query = "SELECT * FROM features WHERE name = $1 ORDER BY version DESC LIMIT 1"
-            params = [name]
-        
         try:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(query, *params)
+                if version:
+                    row = await conn.statements['get_feature_version'].fetchrow(name, version)
+                else:
+                    row = await conn.statements['get_feature_latest'].fetchrow(name)
             
             return dict(row) if row else None
             
@@ -324,16 +768,12 @@ class FeatureRegistry:
         Returns:
             List of feature metadata dicts
         """
-        if entity_type:
-            query = "SELECT * FROM features WHERE entity_type = $1 ORDER BY name, version"
-            params = [entity_type]
-        else:
-            query = "SELECT * FROM features ORDER BY name, version"
-            params = []
-        
         try:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch(query, *params)
+                if entity_type:
+                    rows = await conn.statements['list_features_by_type'].fetch(entity_type)
+                else:
+                    rows = await conn.statements['list_features'].fetch()
             
             return [dict(row) for row in rows]
             
@@ -343,11 +783,9 @@ class FeatureRegistry:
     
     async def get_feature_by_id(self, feature_id: int) -> Optional[Dict]:
         """Get feature metadata by ID"""
-        query = "SELECT * FROM features WHERE id = $1"
-        
         try:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(query, feature_id)
+                row = await conn.statements['get_feature_by_id'].fetchrow(feature_id)
             
             return dict(row) if row else None
             
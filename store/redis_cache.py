@@ -1,32 +1,55 @@
 import redis.asyncio as redis
-import msgpack
+import ormsgpack
 from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ormsgpack (Rust) writes standard msgpack, so entries written by the old
+# msgpack encoder still decode. Bound once to skip attribute lookups in the
+# get_many/set_many comprehensions
+_PACK_OPTIONS = ormsgpack.OPT_NAIVE_UTC | ormsgpack.OPT_SERIALIZE_NUMPY
+_packb = ormsgpack.packb
+_unpackb = ormsgpack.unpackb
+
+# SETs every key with the same TTL in one command:
+# KEYS = cache keys, ARGV[1] = TTL seconds, ARGV[2..] = packed values
+SET_MANY_LUA = """
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, ARGV[i + 1], 'EX', ARGV[1])
+end
+return #KEYS
+"""
+
+# Keys examined per SCAN page during pattern invalidation. Each page is a
+# short command of its own, so serving traffic interleaves between pages
+INVALIDATE_SCAN_COUNT = 1000
+
 
 class FeatureCache:
     """
     Redis-based feature cache for low-latency serving.
-    Uses msgpack for efficient serialization and pipeline for batch operations.
+    Uses ormsgpack for efficient serialization and single commands for batch operations.
     """
     
     def __init__(self, redis_url: str, max_connections: int = 100):
         self.redis_url = redis_url
         self.max_connections = max_connections
         self.client = None
+        self._set_many_script = None
     
     async def connect(self):
         """Initialize Redis connection pool"""
         try:
             self.client = redis.from_url(
                 self.redis_url,
-                decode_responses=False,  # We handle encoding with msgpack
+                decode_responses=False,  # We handle encoding with ormsgpack
                 max_connections=self.max_connections,
                 socket_timeout=5,
                 socket_connect_timeout=5
             )
+            # Scripts are sent by SHA and only loaded on first NOSCRIPT
+            self._set_many_script = self.client.register_script(SET_MANY_LUA)
             # Test connection
             await self.client.ping()
             logger.info(f"Redis connection established (max_connections={self.max_connections})")
@@ -53,7 +76,7 @@ class FeatureCache:
         try:
             value = await self.client.get(key)
             if value:
-                return msgpack.unpackb(value, raw=False)
+                return _unpackb(value)
             return None
         except Exception as e:
             logger.warning(f"Cache get failed for key {key}: {e}")
@@ -61,7 +84,7 @@ class FeatureCache:
     
     async def get_many(self, keys: List[str]) -> List[Optional[Dict]]:
         """
-        Get multiple feature values in a single round-trip using pipeline.
+        Get multiple feature values with a single MGET.
         
         Args:
             keys: List of cache keys
@@ -73,16 +96,12 @@ class FeatureCache:
             return []
         
         try:
-            # Use pipeline for efficient batch retrieval
-            pipe = self.client.pipeline()
-            for key in keys:
-                pipe.get(key)
-            
-            results = await pipe.execute()
+            # One command instead of N pipelined GETs; non-string keys come back as None
+            results = await self.client.mget(keys)
             
             # Deserialize results
             return [
-                msgpack.unpackb(r, raw=False) if r else None
+                _unpackb(r) if r else None
                 for r in results
             ]
             
@@ -101,14 +120,14 @@ class FeatureCache:
             ttl: Time-to-live in seconds
         """
         try:
-            serialized = msgpack.packb(value, use_bin_type=True)
+            serialized = _packb(value, option=_PACK_OPTIONS)
             await self.client.setex(key, ttl, serialized)
         except Exception as e:
             logger.warning(f"Cache set failed for key {key}: {e}")
     
     async def set_many(self, data: Dict[str, Dict], ttl: int = 3600):
         """
-        Set multiple feature values in a single round-trip using pipeline.
+        Set multiple feature values with a single scripted command.
         
         Args:
             data: Dict of {key: value}
@@ -118,18 +137,52 @@ class FeatureCache:
             return
         
         try:
-            # Use pipeline for efficient batch writes
-            pipe = self.client.pipeline()
-            for key, value in data.items():
-                serialized = msgpack.packb(value, use_bin_type=True)
-                pipe.setex(key, ttl, serialized)
+            keys = list(data)
+            packed = [_packb(value, option=_PACK_OPTIONS) for value in data.values()]
+            
+            try:
+                # MSET can't carry a TTL, so the script SETs each key with EX
+                await self._set_many_script(keys=keys, args=[ttl, *packed])
+            except redis.ResponseError as e:
+                # e.g. scripting disabled on a managed Redis: fall back to a
+                # plain pipeline (no MULTI/EXEC), still one round-trip
+                logger.debug(f"set_many script failed, using pipeline: {e}")
+                pipe = self.client.pipeline(transaction=False)
+                for key, serialized in zip(keys, packed):
+                    pipe.setex(key, ttl, serialized)
+                await pipe.execute()
             
-            await pipe.execute()
             logger.debug(f"Cached {len(data)} feature values")
             
         except Exception as e:
             logger.warning(f"Cache set_many failed: {e}")
     
+    async def unlink_many(self, keys: List[str], chunk_size: int = 10000) -> int:
+        """
+        Remove exact cache keys with one UNLINK per chunk.
+        
+        Args:
+            keys: Cache keys to remove
+            chunk_size: Maximum keys per UNLINK command
+            
+        Returns:
+            Number of keys removed
+        """
+        if not keys:
+            return 0
+        
+        try:
+            # Plain pipeline (no MULTI/EXEC): one round-trip, no atomicity needed
+            pipe = self.client.pipeline(transaction=False)
+            for i in range(0, len(keys), chunk_size):
+                pipe.unlink(*keys[i:i + chunk_size])
+            
+            return sum(await pipe.execute())
+            
+        except Exception as e:
+            logger.warning(f"Cache unlink_many failed: {e}")
+            return 0
+    
     async def invalidate(self, pattern: str) -> int:
         """
         Invalidate cache entries matching a pattern.
@@ -141,16 +194,24 @@ class FeatureCache:
             Number of keys deleted
         """
         try:
-            keys = []
-            async for key in self.client.scan_iter(match=pattern, count=100):
-                keys.append(key)
+            # The cursor is driven from here rather than from a Lua script:
+            # a script runs atomically, so walking the whole keyspace inside
+            # one would block Redis just like KEYS. UNLINK frees each page's
+            # memory in a background thread
+            deleted = 0
+            cursor = 0
+            while True:
+                cursor, keys = await self.client.scan(
+                    cursor, match=pattern, count=INVALIDATE_SCAN_COUNT
+                )
+                if keys:
+                    deleted += await self.client.unlink(*keys)
+                if cursor == 0:
+                    break
             
-            if keys:
-                deleted = await self.client.delete(*keys)
+            if deleted:
                 logger.info(f"Invalidated {deleted} cache entries for pattern: {pattern}")
-                return deleted
-            
-            return 0
+            return deleted
             
         except Exception as e:
             logger.error(f"Cache invalidation failed for pattern {pattern}: {e}")
@@ -168,9 +229,11 @@ class FeatureCache:
             memory_info = await self.client.info("memory")
             keyspace = await self.client.info("keyspace")
             
+            # Keys in the DB this client uses, not just db0
+            db = f"db{self.client.connection_pool.connection_kwargs.get('db', 0)}"
             total_keys = 0
-            if 'db0' in keyspace:
-                total_keys = keyspace['db0']['keys']
+            if db in keyspace:
+                total_keys = keyspace[db]['keys']
             
             return {
                 'total_keys': total_keys,
@@ -1,6 +1,8 @@
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import (
-    col, window, avg, stddev, max as spark_max, min as spark_min,
+    col, window, count, greatest, lit, sqrt, when,
+    sum as spark_sum, max as spark_max, min as spark_min,
     from_json, to_timestamp, current_timestamp, unix_timestamp
 )
 from pyspark.sql.types import StructType, StructField, StringType, DoubleType, TimestampType
@@ -8,6 +10,38 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Keys written to Redis per scripted command from each Spark partition
+REDIS_CHUNK_SIZE = 1000
+
+# Windowed aggregate columns COPYed into feature_values_staging, with the
+# Postgres types binary COPY needs to encode them
+STAGING_COLUMNS = [
+    "entity_id", "event_type", "window_start", "window_end",
+    "avg_5min", "stddev_5min", "max_5min", "min_5min", "last_updated"
+]
+STAGING_TYPES = [
+    "varchar", "varchar", "timestamptz", "timestamptz",
+    "float8", "float8", "float8", "float8", "timestamptz"
+]
+COPY_STAGING_SQL = (
+    f"COPY feature_values_staging ({', '.join(STAGING_COLUMNS)}) "
+    "FROM STDIN WITH (FORMAT BINARY)"
+)
+
+# Redis clients per executor Python worker, keyed by URL. Spark reuses
+# workers across tasks, so partitions share one connection pool
+_redis_clients = {}
+
+
+def _redis_client(redis_url: str):
+    """Process-wide Redis client for the given URL"""
+    import redis
+    
+    client = _redis_clients.get(redis_url)
+    if client is None:
+        client = _redis_clients[redis_url] = redis.from_url(redis_url)
+    return client
+
 
 class FeatureProcessor:
     """
@@ -16,21 +50,31 @@ class FeatureProcessor:
     and writes to PostgreSQL and Redis.
     """
     
-    def __init__(self, kafka_brokers: str, postgres_url: str, redis_url: str):
+    def __init__(self, kafka_brokers: str, postgres_url: str, redis_url: str,
+                 shuffle_partitions: int = 10):
         self.kafka_brokers = kafka_brokers
         self.postgres_url = postgres_url
         self.redis_url = redis_url
+        self.shuffle_partitions = shuffle_partitions
         self.spark = None
     
     def initialize_spark(self):
-        """Initialize Spark session with required configurations"""
+        """
+        Initialize Spark session with required configurations.
+        
+        Adaptive query execution only applies to the batch work inside
+        foreachBatch; the stateful window aggregation keeps the shuffle
+        partition count recorded in its checkpoint.
+        """
         self.spark = SparkSession.builder \
             .appName("FeatureStore_Streaming") \
             .config("spark.jars.packages",
-                   "org.apache.spark:spark-sql-kafka-0-10_2.12:3.4.1,"
-                   "org.postgresql:postgresql:42.6.0") \
+                   "org.apache.spark:spark-sql-kafka-0-10_2.12:3.4.1") \
             .config("spark.sql.streaming.checkpointLocation", "/tmp/spark-checkpoints") \
-            .config("spark.sql.shuffle.partitions", "10") \
+            .config("spark.sql.shuffle.partitions", str(self.shuffle_partitions)) \
+            .config("spark.sql.adaptive.enabled", "true") \
+            .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
+            .config("spark.sql.adaptive.skewJoin.enabled", "true") \
             .config("spark.streaming.kafka.maxRatePerPartition", "1000") \
             .getOrCreate()
         
@@ -85,7 +129,12 @@ class FeatureProcessor:
          .withColumn("processing_time", current_timestamp())
         
         # Compute multiple windowed aggregations
-        # 5-minute windows with 1-minute slides
+        # 5-minute windows with 1-minute slides.
+        # These aggregates are all partially evaluated before the shuffle, so
+        # only one partial buffer per (entity, event type, window) and input
+        # partition is exchanged, not the raw events. An explicit 1-minute
+        # pre-aggregation would need a chained streaming aggregation, which
+        # update output mode doesn't support
         windowed = parsed \
             .withWatermark("timestamp", "10 minutes") \
             .groupBy(
@@ -94,8 +143,10 @@ class FeatureProcessor:
                 window("timestamp", "5 minutes", "1 minute")
             ) \
             .agg(
-                avg("value").alias("avg_5min"),
-                stddev("value").alias("stddev_5min"),
+                # Plain sums as window state; mean and stddev are derived below
+                spark_sum("value").alias("s"),
+                spark_sum(col("value") * col("value")).alias("ss"),
+                count("value").alias("n"),
                 spark_max("value").alias("max_5min"),
                 spark_min("value").alias("min_5min"),
                 spark_max("processing_time").alias("last_updated")
@@ -105,8 +156,16 @@ class FeatureProcessor:
                 col("event_type"),
                 col("window.start").alias("window_start"),
                 col("window.end").alias("window_end"),
-                col("avg_5min"),
-                col("stddev_5min"),
+                (col("s") / col("n")).alias("avg_5min"),
+                # Sample stddev, as stddev() computed: NULL for a single value,
+                # and clamped at 0 where rounding leaves a tiny negative variance
+                when(
+                    col("n") > 1,
+                    sqrt(greatest(
+                        (col("ss") - col("s") * col("s") / col("n")) / (col("n") - 1),
+                        lit(0.0)
+                    ))
+                ).alias("stddev_5min"),
                 col("max_5min"),
                 col("min_5min"),
                 col("last_updated")
@@ -130,91 +189,104 @@ class FeatureProcessor:
             batch_df: Spark DataFrame for this batch
             batch_id: Batch identifier
         """
-        if batch_df.isEmpty():
-            logger.debug(f"Batch {batch_id} is empty, skipping")
-            return
-        
-        logger.info(f"Processing batch {batch_id} with {batch_df.count()} records")
-        
-        # Write to PostgreSQL
-        try:
-            self._write_to_postgres(batch_df, batch_id)
-        except Exception as e:
-            logger.error(f"Failed to write batch {batch_id} to PostgreSQL: {e}")
-        
-        # Write to Redis cache
+        # The emptiness check and the write both read the batch; persisting
+        # it means the windowed aggregation isn't recomputed for the write
+        batch_df.persist(StorageLevel.MEMORY_AND_DISK)
         try:
-            self._write_to_redis(batch_df, batch_id)
-        except Exception as e:
-            logger.error(f"Failed to write batch {batch_id} to Redis: {e}")
+            if batch_df.isEmpty():
+                logger.debug(f"Batch {batch_id} is empty, skipping")
+                return
+            
+            # No count() here: it would cost another full pass over the batch
+            logger.info(f"Processing batch {batch_id}")
+            
+            try:
+                self._write_partitions(batch_df, batch_id)
+            except Exception as e:
+                logger.error(f"Failed to write batch {batch_id}: {e}")
+        finally:
+            batch_df.unpersist()
     
-    def _write_to_postgres(self, batch_df, batch_id: int):
+    def _write_partitions(self, batch_df, batch_id: int):
         """
-        Write batch to PostgreSQL using JDBC.
+        Write batch to PostgreSQL and Redis in a single pass per partition.
         
-        Note: In production, consider using COPY protocol for better performance.
+        Each row is COPYed (binary) into feature_values_staging and its
+        cache entries are buffered for Redis, which is written every
+        REDIS_CHUNK_SIZE keys. Postgres is the source of truth, so a Redis
+        failure is logged and the COPY still completes.
         """
-        # Transform to feature_values table format
-        # This is a simplified version - in production, you'd join with features table
-        # to get feature_ids
+        # Bound locally so the closure doesn't capture self (and its SparkSession)
+        postgres_url = self.postgres_url
+        redis_url = self.redis_url
         
-        batch_df.write \
-            .format("jdbc") \
-            .option("url", self.postgres_url) \
-            .option("dbtable", "feature_values_staging") \
-            .option("driver", "org.postgresql.Driver") \
-            .option("batchsize", "1000") \
-            .mode("append") \
-            .save()
-        
-        logger.info(f"Batch {batch_id} written to PostgreSQL")
-    
-    def _write_to_redis(self, batch_df, batch_id: int):
-        """
-        Write recent features to Redis cache for fast lookups.
-        Uses foreachPartition for efficient batch writes.
-        """
-        def write_partition_to_redis(partition):
-            """Write each partition to Redis"""
-            import redis
-            import msgpack
-            from datetime import datetime
+        def write_partition(partition):
+            """COPY each partition into the staging table and cache its features"""
+            import ormsgpack
+            import psycopg
+            from store.redis_cache import SET_MANY_LUA
             
-            try:
-                r = redis.from_url(self.redis_url)
-                pipe = r.pipeline()
-                count = 0
-                
-                for row in partition:
-                    # Create cache keys for each feature
-                    features = {
-                        f"{row.entity_id}:avg_5min_{row.event_type}": {
-                            'value': float(row.avg_5min) if row.avg_5min else None,
-                            'timestamp': row.window_end.isoformat(),
-                            'freshness_seconds': 0
-                        },
-                        f"{row.entity_id}:max_5min_{row.event_type}": {
-                            'value': float(row.max_5min) if row.max_5min else None,
-                            'timestamp': row.window_end.isoformat(),
-                            'freshness_seconds': 0
-                        }
-                    }
-                    
-                    # Write to Redis with 1-hour TTL
-                    for key, value in features.items():
-                        if value['value'] is not None:
-                            pipe.setex(key, 3600, msgpack.packb(value, use_bin_type=True))
-                            count += 1
-                
-                pipe.execute()
-                logger.debug(f"Wrote {count} features to Redis from partition")
-                
-            except Exception as e:
-                logger.error(f"Failed to write partition to Redis: {e}")
+            packb = ormsgpack.packb
+            set_many = _redis_client(redis_url).register_script(SET_MANY_LUA)
+            keys, packed = [], []
+            redis_ok = True
+            count = 0
+            
+            def flush_redis():
+                """SET ... EX (1-hour TTL) the buffered keys in one scripted command"""
+                nonlocal redis_ok, count
+                if redis_ok:
+                    try:
+                        set_many(keys=keys, args=[3600, *packed])
+                        count += len(keys)
+                    except Exception as e:
+                        logger.error(f"Failed to write partition to Redis: {e}")
+                        redis_ok = False
+                keys.clear()
+                packed.clear()
+            
+            with psycopg.connect(postgres_url) as conn, conn.cursor() as cur:
+                with cur.copy(COPY_STAGING_SQL) as copy:
+                    copy.set_types(STAGING_TYPES)
+                    for row in partition:
+                        # Spark hands back naive local datetimes; astimezone()
+                        # makes them aware so they encode as timestamptz
+                        window_end = row.window_end.astimezone()
+                        copy.write_row((
+                            row.entity_id,
+                            row.event_type,
+                            row.window_start.astimezone(),
+                            window_end,
+                            row.avg_5min,
+                            row.stddev_5min,
+                            row.max_5min,
+                            row.min_5min,
+                            row.last_updated.astimezone()
+                        ))
+                        
+                        # ISO 8601, matching what the API writes to the cache
+                        window_end_ts = window_end.isoformat()
+                        for key, value in (
+                            (f"{row.entity_id}:avg_5min_{row.event_type}", row.avg_5min),
+                            (f"{row.entity_id}:max_5min_{row.event_type}", row.max_5min),
+                        ):
+                            if value:
+                                keys.append(key)
+                                packed.append(packb({
+                                    'value': float(value),
+                                    'timestamp': window_end_ts,
+                                    'freshness_seconds': 0
+                                }))
+                        
+                        if len(keys) >= REDIS_CHUNK_SIZE:
+                            flush_redis()
+            
+            if keys:
+                flush_redis()
+            logger.debug(f"Wrote {count} features to Redis from partition")
         
-        # Process each partition
-        batch_df.foreachPartition(write_partition_to_redis)
-        logger.info(f"Batch {batch_id} written to Redis")
+        batch_df.foreachPartition(write_partition)
+        logger.info(f"Batch {batch_id} written to PostgreSQL and Redis")
     
     def stop(self):
         """Stop Spark session"""
@@ -231,7 +303,8 @@ def main():
     processor = FeatureProcessor(
         kafka_brokers=settings.kafka_brokers,
         postgres_url=settings.postgres_url,
-        redis_url=settings.redis_url
+        redis_url=settings.redis_url,
+        shuffle_partitions=settings.spark_shuffle_partitions
     )
     
     try:
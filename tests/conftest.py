@@ -0,0 +1,71 @@
+import os
+import asyncio
+import asyncpg
+import pytest
+import pytest_asyncio
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+from config.settings import settings
+from scripts.init_db import split_statements
+
+
+# Set by pytest-xdist in each worker process (gw0, gw1, ...); unset in a plain run
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+
+INIT_SQL = Path(__file__).parent.parent / "deploy" / "init.sql"
+
+
+def worker_schema(worker: str) -> str:
+    """Postgres schema holding one xdist worker's tables"""
+    return f"test_{worker}"
+
+
+def worker_redis_db(worker: str) -> int:
+    """Redis DB index for one xdist worker; DB 0 is left to plain runs"""
+    return int(worker[2:]) + 1
+
+
+if XDIST_WORKER:
+    # Point every pool opened by this worker (test fixtures and the app's
+    # lifespan alike) at its own schema and Redis DB. asyncpg passes unknown
+    # DSN query parameters on as server settings
+    separator = "&" if "?" in settings.postgres_url else "?"
+    settings.postgres_url += f"{separator}search_path={worker_schema(XDIST_WORKER)},public"
+    settings.redis_url = urlunsplit(
+        urlsplit(settings.redis_url)._replace(path=f"/{worker_redis_db(XDIST_WORKER)}")
+    )
+
+
+@pytest.fixture(scope="session")
+def event_loop_policy():
+    """Run every async test and fixture on uvloop where it's available"""
+    try:
+        import uvloop
+    except ImportError:
+        # uvloop is not available on Windows
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session", autouse=True)
+async def xdist_worker_schema():
+    """Create this worker's schema from deploy/init.sql, and drop it afterwards"""
+    if not XDIST_WORKER:
+        yield
+        return
+    
+    schema = worker_schema(XDIST_WORKER)
+    conn = await asyncpg.connect(settings.postgres_url)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {schema}")
+        # search_path already names the schema, so the script's tables land in it
+        for group in split_statements(INIT_SQL.read_text()):
+            for statement in group:
+                await conn.execute(statement)
+        
+        yield
+        
+        await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    finally:
+        await conn.close()
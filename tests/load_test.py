@@ -1,8 +1,50 @@
 from locust import HttpUser, task, between, events
+from array import array
+from itertools import chain, combinations
+import numpy as np
+import orjson
 import random
-import time
+from time import perf_counter_ns
 from datetime import datetime
 
+# Shared by every simulated user rather than rebuilt in each on_start
+ENTITY_IDS = tuple(f"user_{i}" for i in range(1, 10001))
+# Same IDs as an object array, so a batch of sampled indices is one fancy-index
+ENTITY_ARRAY = np.array(ENTITY_IDS, dtype=object)
+FEATURE_NAMES = (
+    "user_age",
+    "user_lifetime_value",
+    "last_purchase_days",
+    "avg_5min_purchase_value"
+)
+# Every 2-4 feature subset, so a request picks one by index instead of sampling
+FEATURE_COMBOS = tuple(chain.from_iterable(
+    combinations(FEATURE_NAMES, k) for k in range(2, 5)
+))
+# Latency SLAs for single-entity online lookups, checked once at test stop
+SLA_MEDIAN_MS = 10
+SLA_P99_MS = 15
+
+# JSON fragment for requests asking for every feature, spliced into bodies as-is
+FEATURE_NAMES_JSON = orjson.dumps(FEATURE_NAMES)
+
+
+def _large_batch_bodies(count: int = 10):
+    """(batch size, request body) pairs for 100-500 entity batch requests"""
+    rng = np.random.default_rng()
+    bodies = []
+    for batch_size in rng.integers(100, 500, size=count, endpoint=True):
+        entity_ids = ENTITY_ARRAY[rng.choice(len(ENTITY_ARRAY), batch_size, replace=False, shuffle=False)].tolist()
+        bodies.append((
+            int(batch_size),
+            b'{"entity_ids":%s,"feature_names":%s}' % (orjson.dumps(entity_ids), FEATURE_NAMES_JSON)
+        ))
+    return tuple(bodies)
+
+
+# Built once per process; each large-batch request just picks one
+LARGE_BATCH_BODIES = _large_batch_bodies()
+
 
 class FeatureStoreUser(HttpUser):
     """
@@ -19,16 +61,18 @@ class FeatureStoreUser(HttpUser):
     
     wait_time = between(0.1, 0.5)
     
+    # Read-only lookup data, shared by every user through the class
+    entity_ids = ENTITY_IDS
+    feature_names = FEATURE_NAMES
+    feature_combos = FEATURE_COMBOS
+    
     def on_start(self):
         """Initialize user session"""
         self.headers = {"X-API-Key": "tenant1_key"}
-        self.entity_ids = [f"user_{i}" for i in range(1, 10001)]
-        self.feature_names = [
-            "user_age",
-            "user_lifetime_value",
-            "last_purchase_days",
-            "avg_5min_purchase_value"
-        ]
+        # POST bodies are encoded with orjson and sent as raw data
+        self.json_headers = {**self.headers, "Content-Type": "application/json"}
+        # Used for whole-batch sampling; single indices come from random
+        self.rng = np.random.default_rng()
     
     @task(10)
     def get_online_features_single(self):
@@ -37,31 +81,23 @@ class FeatureStoreUser(HttpUser):
         This is the most common use case - low latency single lookups.
         Weighted at 10x to simulate production traffic patterns.
         """
-        entity_id = random.choice(self.entity_ids)
-        num_features = random.randint(2, 4)
-        features = random.sample(self.feature_names, num_features)
+        entity_id = self.entity_ids[random.randrange(len(self.entity_ids))]
+        # One draw over the 11 precomputed subsets; random's scalar draw is
+        # several times cheaper than a numpy Generator call per request
+        features = self.feature_combos[random.randrange(len(self.feature_combos))]
+        body = orjson.dumps({"entity_id": entity_id, "feature_names": features})
         
-        start_time = time.time()
+        start = perf_counter_ns()
         with self.client.post(
             "/api/v1/features/online",
-            json={
-                "entity_id": entity_id,
-                "feature_names": features
-            },
-            headers=self.headers,
+            data=body,
+            headers=self.json_headers,
             catch_response=True
         ) as response:
-            elapsed = (time.time() - start_time) * 1000  # Convert to ms
-            
             if response.status_code == 200:
-                # Check latency SLA
-                if elapsed > 15:
-                    response.failure(f"Too slow: {elapsed:.2f}ms (SLA: <15ms p99)")
-                elif elapsed > 10:
-                    # Warning but not failure
-                    pass
-                else:
-                    response.success()
+                # Latency SLAs are evaluated from these samples at test stop
+                self.environment.online_latency.append(perf_counter_ns() - start)
+                response.success()
             else:
                 response.failure(f"Got {response.status_code}")
     
@@ -72,19 +108,20 @@ class FeatureStoreUser(HttpUser):
         Simulates popular entities that should be cached.
         """
         # Use a small set of "hot" entity IDs
-        hot_entity_id = f"user_{random.randint(1, 100)}"
+        hot_entity_id = self.entity_ids[random.randrange(100)]
+        # Entity IDs are plain ASCII, so no JSON escaping is needed
+        body = b'{"entity_id":"%s","feature_names":%s}' % (
+            hot_entity_id.encode(), FEATURE_NAMES_JSON
+        )
         
         with self.client.post(
             "/api/v1/features/online",
-            json={
-                "entity_id": hot_entity_id,
-                "feature_names": self.feature_names
-            },
-            headers=self.headers,
+            data=body,
+            headers=self.json_headers,
             catch_response=True
         ) as response:
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if data.get("cache_hit"):
                     response.success()
                 else:
@@ -100,15 +137,18 @@ class FeatureStoreUser(HttpUser):
         Used for batch predictions on small cohorts.
         """
         batch_size = random.randint(10, 50)
-        entity_ids = random.sample(self.entity_ids, batch_size)
+        # Batch order doesn't matter, so skip shuffling the sampled indices
+        idx = self.rng.choice(len(self.entity_ids), batch_size, replace=False, shuffle=False)
+        entity_ids = ENTITY_ARRAY[idx].tolist()
         
         with self.client.post(
             "/api/v1/features/batch",
-            json={
+            data=orjson.dumps({
                 "entity_ids": entity_ids,
-                "feature_names": random.sample(self.feature_names, 2)
-            },
-            headers=self.headers,
+                # The first six combos are the feature pairs
+                "feature_names": self.feature_combos[random.randrange(6)]
+            }),
+            headers=self.json_headers,
             catch_response=True
         ) as response:
             if response.status_code == 200:
@@ -122,20 +162,16 @@ class FeatureStoreUser(HttpUser):
         Test large batch feature retrieval (100-500 entities).
         Used for batch predictions and training data generation.
         """
-        batch_size = random.randint(100, 500)
-        entity_ids = random.sample(self.entity_ids, batch_size)
+        batch_size, body = LARGE_BATCH_BODIES[random.randrange(len(LARGE_BATCH_BODIES))]
         
         with self.client.post(
             "/api/v1/features/batch",
-            json={
-                "entity_ids": entity_ids,
-                "feature_names": self.feature_names
-            },
-            headers=self.headers,
+            data=body,
+            headers=self.json_headers,
             catch_response=True
         ) as response:
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 if data["count"] != batch_size:
                     response.failure(f"Expected {batch_size} entities, got {data['count']}")
                 else:
@@ -226,12 +262,17 @@ class AdminUser(HttpUser):
 @events.test_start.add_listener
 def on_test_start(environment, **kwargs):
     """Print test information at start"""
+    # Raw single-lookup latencies in ns; appending a machine int is far
+    # cheaper per request than updating a histogram. In distributed runs
+    # each worker keeps its own buffer
+    environment.online_latency = array('q')
+    
     print(f"\n{'='*60}")
     print(f"Feature Store Load Test")
     print(f"Target: {environment.host}")
     print(f"Performance SLAs:")
-    print(f"  - Median latency: <10ms")
-    print(f"  - P99 latency: <15ms")
+    print(f"  - Median latency: <{SLA_MEDIAN_MS}ms")
+    print(f"  - P99 latency: <{SLA_P99_MS}ms")
     print(f"  - Throughput: 500K features/sec")
     print(f"  - Cache hit rate: >85%")
     print(f"{'='*60}\n")
@@ -248,7 +289,14 @@ def on_test_stop(environment, **kwargs):
     print(f"Total failures: {stats.total.num_failures}")
     print(f"Average response time: {stats.total.avg_response_time:.2f}ms")
     print(f"Median response time: {stats.total.median_response_time:.2f}ms")
-    print(f"95th percentile: {stats.total.get_response_time_percentile(0.95):.2f}ms")
-    print(f"99th percentile: {stats.total.get_response_time_percentile(0.99):.2f}ms")
     print(f"Requests per second: {stats.total.total_rps:.2f}")
+    
+    samples = getattr(environment, "online_latency", None)
+    if samples:
+        # One vectorised pass over the raw buffer, no copy
+        p50, p95, p99 = np.percentile(np.frombuffer(samples, dtype=np.int64), [50, 95, 99]) / 1e6
+        print(f"Online lookups: {len(samples)}")
+        print(f"  Median: {p50:.2f}ms {'OK' if p50 < SLA_MEDIAN_MS else f'MISSED (SLA: <{SLA_MEDIAN_MS}ms)'}")
+        print(f"  95th percentile: {p95:.2f}ms")
+        print(f"  99th percentile: {p99:.2f}ms {'OK' if p99 < SLA_P99_MS else f'MISSED (SLA: <{SLA_P99_MS}ms)'}")
     print(f"{'='*60}\n")
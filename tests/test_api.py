@@ -1,3 +1,4 @@
+import orjson
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
@@ -5,15 +6,24 @@ from datetime import datetime
 from api.main import app
 
 
-@pytest_asyncio.fixture
+# One entity over the batch endpoint's 1000-entity limit, encoded once
+OVERSIZED_BATCH_BODY = orjson.dumps({
+    "entity_ids": [f"user_{i}" for i in range(1001)],
+    "feature_names": ["user_age"]
+})
+
+
+# One client and transport for the whole session, used from the session's
+# event loop by every test
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def client():
-    """Create test client with proper lifespan handling"""
+    """Create test client dispatching straight into the ASGI app"""
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
         yield ac
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_health_check(client):
     """Test health check endpoint"""
     response = await client.get("/health")
@@ -23,7 +33,7 @@ async def test_health_check(client):
     assert "timestamp" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_online_features_unauthorized(client):
     """Test online features without API key"""
     response = await client.post(
@@ -36,7 +46,21 @@ async def test_online_features_unauthorized(client):
     assert response.status_code == 401
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
+async def test_online_features_invalid_key(client):
+    """Test online features with an unknown API key"""
+    response = await client.post(
+        "/api/v1/features/online",
+        json={
+            "entity_id": "user_123",
+            "feature_names": ["age", "lifetime_value"]
+        },
+        headers={"X-API-Key": "not_a_real_key"}
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_online_features_success(client):
     """Test successful online feature retrieval"""
     response = await client.post(
@@ -54,7 +78,7 @@ async def test_online_features_success(client):
     assert "timestamp" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_batch_features_success(client):
     """Test batch feature retrieval"""
     response = await client.post(
@@ -71,22 +95,18 @@ async def test_batch_features_success(client):
     assert "count" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_batch_features_too_many_entities(client):
     """Test batch request with too many entities"""
-    entity_ids = [f"user_{i}" for i in range(1001)]
     response = await client.post(
         "/api/v1/features/batch",
-        json={
-            "entity_ids": entity_ids,
-            "feature_names": ["user_age"]
-        },
-        headers={"X-API-Key": "tenant1_key"}
+        content=OVERSIZED_BATCH_BODY,
+        headers={"X-API-Key": "tenant1_key", "Content-Type": "application/json"}
     )
     assert response.status_code == 400
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_register_feature(client):
     """Test feature registration"""
     response = await client.post(
@@ -108,7 +128,7 @@ async def test_register_feature(client):
     assert "feature_id" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_list_features(client):
     """Test listing all features"""
     response = await client.get(
@@ -121,7 +141,7 @@ async def test_list_features(client):
     assert "count" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_get_feature_metadata(client):
     """Test getting feature metadata"""
     response = await client.get(
@@ -135,7 +155,7 @@ async def test_get_feature_metadata(client):
     assert "dtype" in data
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_get_nonexistent_feature(client):
     """Test getting metadata for nonexistent feature"""
     response = await client.get(
@@ -145,7 +165,7 @@ async def test_get_nonexistent_feature(client):
     assert response.status_code == 404
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_invalidate_cache(client):
     """Test cache invalidation"""
     response = await client.delete(
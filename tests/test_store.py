@@ -1,56 +1,83 @@
+import asyncio
+import os
 import pytest
 import pytest_asyncio
-from datetime import datetime, timedelta
-from store.postgres import FeatureStore, FeatureRegistry
+from datetime import datetime, timedelta, timezone
+from store.postgres import COPY_MIN_ROWS, FeatureStore, FeatureRegistry
 from store.redis_cache import FeatureCache
 from config.settings import settings
 
 
-@pytest_asyncio.fixture
+# Tests and fixtures share the session's event loop, so the pools opened by
+# the session-scoped fixtures below are reused by every test
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def feature_store():
-    """Create feature store instance"""
+    """Create feature store instance, shared by the whole session"""
     store = FeatureStore(settings.postgres_url)
     await store.connect()
     yield store
     await store.close()
 
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def feature_registry():
-    """Create feature registry instance"""
+    """Create feature registry instance, shared by the whole session"""
     registry = FeatureRegistry(settings.postgres_url)
     await registry.connect()
     yield registry
     await registry.close()
 
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def feature_cache():
-    """Create feature cache instance"""
+    """Create feature cache instance, shared by the whole session"""
     cache = FeatureCache(settings.redis_url)
     await cache.connect()
-    # Clear cache before test
-    await cache.flush()
     yield cache
     await cache.close()
 
 
-@pytest.mark.asyncio
+@pytest_asyncio.fixture(autouse=True, loop_scope="session")
+async def _clean_cache(feature_cache):
+    """Clear the shared cache before each test"""
+    await feature_cache.flush()
+
+
+@pytest.fixture
+def redis_commands(feature_cache, monkeypatch):
+    """
+    Names of the Redis commands the cache sends outside a pipeline.
+    Patched on the client instance, so registered scripts are counted too;
+    pipelines write to the connection directly and record nothing
+    """
+    commands = []
+    execute_command = feature_cache.client.execute_command
+    
+    async def counting_execute_command(*args, **options):
+        commands.append(args[0])
+        return await execute_command(*args, **options)
+    
+    monkeypatch.setattr(feature_cache.client, 'execute_command', counting_execute_command)
+    return commands
+
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_write_and_read_features(feature_store):
     """Test writing and reading features"""
     # Write test features
+    now = datetime.now(timezone.utc)
     features = [
         {
             'feature_id': 1,
             'entity_id': 'user_test_1',
-            'timestamp': datetime.utcnow(),
+            'timestamp': now,
             'value': 25,
             'metadata': {'source': 'test'}
         },
         {
             'feature_id': 2,
             'entity_id': 'user_test_1',
-            'timestamp': datetime.utcnow(),
+            'timestamp': now,
             'value': 1500.50,
             'metadata': {'source': 'test'}
         }
@@ -62,17 +89,17 @@ async def test_write_and_read_features(feature_store):
     result = await feature_store.get_features(
         entity_ids=['user_test_1'],
         feature_names=['user_age', 'user_lifetime_value'],
-        timestamp=datetime.utcnow()
+        timestamp=now + timedelta(microseconds=1)
     )
     
     assert 'user_test_1' in result
     assert len(result['user_test_1']) > 0
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_point_in_time_correctness(feature_store):
     """Test point-in-time feature retrieval"""
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     past = now - timedelta(hours=2)
     
     # Write features at different times
@@ -106,7 +133,149 @@ async def test_point_in_time_correctness(feature_store):
         assert result['user_test_2']['user_age']['value'] == 20
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
+async def test_write_modes_on_existing_key(feature_store):
+    """Test append keeps an existing row while upsert overwrites it"""
+    now = datetime.now(timezone.utc)
+    row = {'feature_id': 1, 'entity_id': 'user_test_modes', 'timestamp': now, 'metadata': {}}
+    
+    await feature_store.write_features([{**row, 'value': 1}])
+    await feature_store.write_features([{**row, 'value': 2}], write_mode='append')
+    history = await feature_store.get_feature_history('user_test_modes', 'user_age', now, now)
+    assert [h['value'] for h in history] == [1]
+    
+    await feature_store.write_features([{**row, 'value': 3}], write_mode='upsert')
+    history = await feature_store.get_feature_history('user_test_modes', 'user_age', now, now)
+    assert [h['value'] for h in history] == [3]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_append_copy_conflict_falls_back_to_merge(feature_store):
+    """Test a COPY-sized append batch that hits an existing row still writes the rest"""
+    now = datetime.now(timezone.utc)
+    timestamps = [now - timedelta(seconds=i) for i in range(COPY_MIN_ROWS)]
+    
+    await feature_store.write_features([{
+        'feature_id': 1, 'entity_id': 'user_test_copy', 'timestamp': timestamps[0], 'value': -1
+    }])
+    await feature_store.write_features([
+        {'feature_id': 1, 'entity_id': 'user_test_copy', 'timestamp': ts, 'value': i}
+        for i, ts in enumerate(timestamps)
+    ])
+    
+    history = await feature_store.get_feature_history(
+        'user_test_copy', 'user_age', timestamps[-1], timestamps[0]
+    )
+    values = {h['timestamp']: h['value'] for h in history}
+    assert len(values) == COPY_MIN_ROWS
+    # The existing row is kept; every other row is written
+    assert values[timestamps[0]] == -1
+    assert all(values[ts] == i for i, ts in enumerate(timestamps) if i)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("batch_size", [2, COPY_MIN_ROWS])
+@pytest.mark.parametrize("write_mode", ['append', 'upsert'])
+async def test_batch_duplicates_keep_last_row(feature_store, batch_size, write_mode):
+    """Test the last of several rows for one key wins on both the INSERT and COPY paths"""
+    entity_id = f'user_test_dup_{write_mode}_{batch_size}'
+    now = datetime.now(timezone.utc)
+    features = [
+        {'feature_id': 1, 'entity_id': entity_id, 'timestamp': now - timedelta(seconds=i), 'value': i}
+        for i in range(batch_size - 1)
+    ]
+    features.append({'feature_id': 1, 'entity_id': entity_id, 'timestamp': now, 'value': -1})
+    
+    await feature_store.write_features(features, write_mode=write_mode)
+    
+    history = await feature_store.get_feature_history(entity_id, 'user_age', now, now)
+    assert [h['value'] for h in history] == [-1]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_iter_feature_history(feature_store):
+    """Test history streams every value in range, oldest first"""
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=10)
+    timestamps = [start + timedelta(seconds=i) for i in range(3)]
+    await feature_store.write_features([
+        {'feature_id': 1, 'entity_id': 'user_test_history', 'timestamp': ts, 'value': v}
+        for ts, v in zip(reversed(timestamps), ['gold', 2.5, 7])
+    ])
+    
+    history = [
+        row async for row in feature_store.iter_feature_history(
+            'user_test_history', 'user_age', timestamps[0], timestamps[-1]
+        )
+    ]
+    
+    assert [h['timestamp'] for h in history] == timestamps
+    assert [h['value'] for h in history] == [7, 2.5, 'gold']
+    assert all(h['metadata'] == {} for h in history)
+    
+    # Unregistered feature names stream nothing rather than failing
+    assert [row async for row in feature_store.iter_feature_history(
+        'user_test_history', 'no_such_feature', timestamps[0], timestamps[-1]
+    )] == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_feature_history_bucketed(feature_store):
+    """Test bucketed history aggregates numeric values and counts every row"""
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=10)
+    await feature_store.write_features([
+        {'feature_id': 1, 'entity_id': 'user_test_bucketed', 'timestamp': start + timedelta(seconds=s), 'value': v}
+        # A non-numeric JSONB value in the first bucket must not break the cast
+        for s, v in [(0, 1), (10, 2.0), (20, 3), (30, 'n/a'), (60, 10)]
+    ])
+    end = start + timedelta(minutes=2)
+    
+    avg = await feature_store.get_feature_history_bucketed(
+        'user_test_bucketed', 'user_age', start, end, bucket=timedelta(minutes=1)
+    )
+    assert [b['bucket'] for b in avg] == [start, start + timedelta(minutes=1)]
+    assert [b['value'] for b in avg] == [2.0, 10.0]
+    
+    count = await feature_store.get_feature_history_bucketed(
+        'user_test_bucketed', 'user_age', start, end, bucket=timedelta(minutes=1), agg='count'
+    )
+    assert [b['value'] for b in count] == [4, 1]
+    
+    with pytest.raises(ValueError):
+        await feature_store.get_feature_history_bucketed(
+            'user_test_bucketed', 'user_age', start, end, agg='median'
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_window_stats(feature_store):
+    """Test window stats come from the newest 5-minute bucket"""
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    # Start of a 5-minute bucket, well clear of the current one
+    bucket = now.replace(minute=now.minute - now.minute % 5) - timedelta(minutes=15)
+    await feature_store.write_features([
+        {'feature_id': 1, 'entity_id': 'user_test_window', 'timestamp': ts, 'value': v}
+        for ts, v in [
+            (bucket - timedelta(minutes=5), 100),
+            (bucket + timedelta(seconds=1), 2),
+            (bucket + timedelta(seconds=2), 4),
+        ]
+    ])
+    
+    # feature_5min is real-time, so unmaterialized rows are included
+    result = await feature_store.get_window_stats(
+        entity_ids=['user_test_window'],
+        feature_names=['user_age'],
+        timestamp=bucket + timedelta(minutes=1)
+    )
+    
+    stats = result['user_test_window']['user_age']
+    assert stats['bucket'] == bucket
+    assert stats['avg'] == 3.0
+    assert stats['min'] == 2.0
+    assert stats['max'] == 4.0
+
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_register_feature(feature_registry):
     """Test feature registration"""
     feature_id, created_at = await feature_registry.register(
@@ -128,7 +297,7 @@ async def test_register_feature(feature_registry):
     assert feature['name'] == 'test_feature_new'
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_list_features_by_entity_type(feature_registry):
     """Test listing features filtered by entity type"""
     features = await feature_registry.list_features(entity_type='user')
@@ -136,13 +305,13 @@ async def test_list_features_by_entity_type(feature_registry):
     assert all(f['entity_type'] == 'user' for f in features)
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_cache_set_and_get(feature_cache):
     """Test basic cache operations"""
     key = "user_test_cache:age"
     value = {
         'value': 30,
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
         'freshness_seconds': 0
     }
     
@@ -153,28 +322,32 @@ async def test_cache_set_and_get(feature_cache):
     assert retrieved['value'] == 30
 
 
-@pytest.mark.asyncio
-async def test_cache_get_many(feature_cache):
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_get_many(feature_cache, redis_commands):
     """Test batch cache retrieval"""
     keys = [f"user_batch:feature_{i}" for i in range(5)]
     data = {
         key: {
             'value': i * 10,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
             'freshness_seconds': 0
         }
         for i, key in enumerate(keys)
     }
     
     await feature_cache.set_many(data, ttl=60)
+    redis_commands.clear()
     results = await feature_cache.get_many(keys)
     
     assert len(results) == 5
     assert all(r is not None for r in results)
+    # One MGET, not a GET per key. Compared exactly: a pipeline of GETs
+    # would record nothing at all
+    assert redis_commands == ['MGET']
 
 
-@pytest.mark.asyncio
-async def test_cache_invalidate_pattern(feature_cache):
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_invalidate_pattern(feature_cache, redis_commands):
     """Test cache invalidation by pattern"""
     # Set multiple keys
     data = {
@@ -184,15 +357,53 @@ async def test_cache_invalidate_pattern(feature_cache):
     await feature_cache.set_many(data, ttl=60)
     
     # Invalidate by pattern
+    redis_commands.clear()
     count = await feature_cache.invalidate("user_123:*")
     assert count == 3
+    # One UNLINK per SCAN page that found keys, not a DEL per key
+    assert set(redis_commands) == {'SCAN', 'UNLINK'}
+    assert redis_commands.count('UNLINK') <= redis_commands.count('SCAN')
     
     # Verify keys are gone
     results = await feature_cache.get_many(list(data.keys()))
     assert all(r is None for r in results)
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_invalidate_many_keys(feature_cache, redis_commands):
+    """Test pattern invalidation of 10K keys pages through SCAN, never KEYS"""
+    data = {f"user_bulk:feature_{i}": {'value': i} for i in range(10_000)}
+    await feature_cache.set_many(data, ttl=60)
+    redis_commands.clear()
+    
+    count = await feature_cache.invalidate("user_bulk:*")
+    
+    assert count == 10_000
+    # KEYS and DEL would block Redis's main thread for the whole keyspace;
+    # several short SCAN pages let other clients run in between
+    assert 'KEYS' not in redis_commands and 'DEL' not in redis_commands
+    assert 'UNLINK' in redis_commands
+    assert redis_commands.count('SCAN') > 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_cache_unlink_many(feature_cache):
+    """Test removing exact cache keys in chunks"""
+    data = {
+        f"user_unlink:feature_{i}": {'value': i}
+        for i in range(5)
+    }
+    await feature_cache.set_many(data, ttl=60)
+    
+    # Chunk size below the key count forces several UNLINK commands
+    count = await feature_cache.unlink_many(list(data.keys()), chunk_size=2)
+    assert count == 5
+    
+    results = await feature_cache.get_many(list(data.keys()))
+    assert all(r is None for r in results)
+
+
+@pytest.mark.asyncio(loop_scope="session")
 async def test_cache_stats(feature_cache):
     """Test cache statistics retrieval"""
     # Add some data
@@ -202,3 +413,29 @@ async def test_cache_stats(feature_cache):
     assert 'total_keys' in stats
     assert 'used_memory_mb' in stats
     assert 'hit_rate' in stats
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.skipif(
+    "PYTEST_XDIST_WORKER" in os.environ,
+    reason="Redis hit/miss counters are server-wide, so parallel workers skew them"
+)
+async def test_cache_hit_rate(feature_cache):
+    """Test the reported hit rate against a known mix of hits and misses"""
+    await feature_cache.set_many({f"user_hits:feature_{i}": {'value': i} for i in range(3)}, ttl=60)
+    await feature_cache.set_many({f"user_expired:feature_{i}": {'value': i} for i in range(2)}, ttl=1)
+    await asyncio.sleep(1.1)
+    await feature_cache.client.config_resetstat()
+    
+    for i in range(3):
+        assert await feature_cache.get(f"user_hits:feature_{i}") is not None
+    # Redis drops a key once its TTL passes, so reading it counts as a miss
+    for i in range(2):
+        assert await feature_cache.get(f"user_expired:feature_{i}") is None
+    for i in range(5):
+        assert await feature_cache.get(f"user_missing:feature_{i}") is None
+    
+    stats = await feature_cache.get_stats()
+    assert stats['keyspace_hits'] == 3
+    assert stats['keyspace_misses'] == 7
+    assert abs(stats['hit_rate'] - 30.0) < 1e-9  # percent
@@ -0,0 +1,47 @@
+import pytest
+from store.postgres import INT8_MAX, INT8_MIN, VALUE_COLUMNS, row_value, split_value
+
+
+@pytest.mark.parametrize("value, column", [
+    (True, 'value_b'),
+    (False, 'value_b'),
+    (0, 'value_i8'),
+    (INT8_MIN, 'value_i8'),
+    (INT8_MAX, 'value_i8'),
+    (INT8_MIN - 1, 'value'),
+    (INT8_MAX + 1, 'value'),
+    (1.5, 'value_f8'),
+    (0.0, 'value_f8'),
+    ('gold', 'value'),
+    ([1, 2, 3], 'value'),
+    ({'tier': 'gold'}, 'value'),
+])
+def test_split_value_routes_to_column(value, column):
+    """Test each value lands in exactly one typed column, unchanged"""
+    split = split_value(value)
+    
+    assert len(split) == len(VALUE_COLUMNS)
+    assert [c for c, v in zip(VALUE_COLUMNS, split) if v is not None] == [column]
+    assert split[VALUE_COLUMNS.index(column)] is value
+
+
+def test_split_value_none():
+    """Test None leaves every column NULL"""
+    assert split_value(None) == (None,) * len(VALUE_COLUMNS)
+
+
+@pytest.mark.parametrize("value", [
+    True, False, 0, -7, INT8_MAX, INT8_MAX + 1, 0.0, 2.5, 'gold', [1, 2], {'tier': 'gold'}
+])
+def test_row_value_round_trips_split_value(value):
+    """Test reading a row back returns the value that was split into it"""
+    row = dict(zip(VALUE_COLUMNS, split_value(value)))
+    
+    result = row_value(row)
+    assert result == value
+    assert type(result) is type(value)
+
+
+def test_row_value_all_null():
+    """Test a row with no value set reads back as None"""
+    assert row_value(dict.fromkeys(VALUE_COLUMNS)) is None